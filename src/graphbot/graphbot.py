@@ -50,7 +50,6 @@ class GraphBot:
         self.query_builder = QueryBuilder()
         self.running = False
         self.mapping_task: Optional[asyncio.Task] = None
-        self.cache_saver_task: Optional[asyncio.Task] = None
         
         # New: Main Agent Router context
         self._router_context = {
@@ -83,21 +82,6 @@ class GraphBot:
             console.print("[yellow]Please check your environment variables and try again.[/yellow]")
             return False
 
-    async def _auto_save_cache_loop(self):
-        """Background task to periodically save cache if dirty."""
-        cache_manager = get_cache_manager()
-        while self.running:
-            try:
-                await asyncio.sleep(60) # Save every minute
-                await asyncio.to_thread(cache_manager.save_if_dirty)
-            except asyncio.CancelledError:
-                break
-            except Exception:
-                pass
-        
-        # Final save on exit
-        await asyncio.to_thread(cache_manager.save_if_dirty)
-
     async def _run_auto_mapping_async(self):
         """Run the insight agent to map the database in background."""
         if not self.neo4j or not self.neo4j.driver:
@@ -333,9 +317,6 @@ class GraphBot:
         self.display_welcome()
         self.running = True
         
-        # Start cache saver
-        self.cache_saver_task = asyncio.create_task(self._auto_save_cache_loop())
-        
         while self.running:
             try:
                 # User Input
@@ -367,13 +348,8 @@ class GraphBot:
             except Exception as e:
                 console.print(f"[bold bright_red]❌ Unexpected error: {str(e)}[/bold bright_red]")
         
-        # Cleanup
-        if self.cache_saver_task:
-            self.cache_saver_task.cancel()
-            try:
-                await self.cache_saver_task
-            except asyncio.CancelledError:
-                pass
+        # Cleanup (the cache manager flushes periodically; persist what is left)
+        await asyncio.to_thread(get_cache_manager().close)
 
         if self.neo4j:
             await self.neo4j.close_async()
@@ -1,7 +1,7 @@
 """Neo4j database connection and query execution handler."""
 import os
 import asyncio
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 from neo4j import AsyncGraphDatabase, AsyncDriver
 from neo4j.exceptions import (
     ServiceUnavailable,
@@ -35,6 +35,65 @@ class Neo4jQueryError(Exception):
 MAX_QUERY_RETRIES = 2
 RETRY_DELAY = 0.5
 
+# Connection pool defaults, matching the driver's own; overridable through the environment
+MAX_CONNECTION_POOL_SIZE = 100
+CONNECTION_ACQUISITION_TIMEOUT = 60.0
+
+
+def _env_number(name: str, default: Any, cast: Callable[[str], Any]) -> Any:
+    """Read a numeric setting from the environment, keeping the default if it is unset or malformed."""
+    raw = os.getenv(name)
+    if raw is None or not raw.strip():
+        return default
+    try:
+        return cast(raw)
+    except ValueError:
+        console.print(f"[yellow]⚠️  Ignoring invalid {name}={raw!r}; using {default}[/yellow]")
+        return default
+
+
+def _convert_node(value) -> dict[str, Any]:
+    """Convert a Neo4j Node into a plain dictionary."""
+    return {
+        'type': 'Node',
+        'id': value.id,
+        'labels': list(value.labels),
+        'properties': dict(value)
+    }
+
+
+def _convert_relationship(value) -> dict[str, Any]:
+    """Convert a Neo4j Relationship into a plain dictionary."""
+    return {
+        'type': 'Relationship',
+        'id': value.id,
+        'type_name': value.type,
+        'start_node': value.start_node.id,
+        'end_node': value.end_node.id,
+        'properties': dict(value)
+    }
+
+
+def _passthrough(value):
+    """Return values that need no conversion unchanged."""
+    return value
+
+
+# Converter chosen once per value class, so records skip the per-field name checks
+_VALUE_CONVERTERS: dict[type, Callable[[Any], Any]] = {}
+
+
+def _converter_for(cls: type) -> Callable[[Any], Any]:
+    """Resolve and memoize the converter for a value class."""
+    if cls.__name__ == 'Node':
+        converter = _convert_node
+    elif cls.__name__ == 'Relationship':
+        converter = _convert_relationship
+    else:
+        converter = _passthrough
+    _VALUE_CONVERTERS[cls] = converter
+    return converter
+
 
 class Neo4jHandler:
     """Handles Neo4j database connections and query execution using Async Driver."""
@@ -59,11 +118,22 @@ class Neo4jHandler:
         try:
             # Create async driver
             # Note: This doesn't establish a connection yet, just configures the driver
-            self.driver = AsyncGraphDatabase.driver(self.uri, auth=(self.user, self.password))
+            self.driver = self._create_driver()
         except Exception as e:
             console.print(f"[bold bright_red]❌ Failed to create Neo4j driver: {str(e)}[/bold bright_red]")
             self.driver = None
 
+    def _create_driver(self) -> AsyncDriver:
+        """Create an async driver for the current credentials with the configured pool settings."""
+        return AsyncGraphDatabase.driver(
+            self.uri,
+            auth=(self.user, self.password),
+            max_connection_pool_size=_env_number("NEO4J_MAX_POOL_SIZE", MAX_CONNECTION_POOL_SIZE, int),
+            connection_acquisition_timeout=_env_number(
+                "NEO4J_ACQUISITION_TIMEOUT", CONNECTION_ACQUISITION_TIMEOUT, float
+            ),
+        )
+
     def connect(self, uri, user, password, database=None):
         """Synchronous wrapper for connect."""
         asyncio.run(self.connect_async(uri, user, password, database))
@@ -78,8 +148,7 @@ class Neo4jHandler:
             password: Password
             database: Database name (optional)
         """
-        # Close existing connection if open
-        await self.close_async()
+        old_driver = self.driver
         
         self.uri = uri
         self.user = user
@@ -88,10 +157,14 @@ class Neo4jHandler:
             self.database = database
             
         # Re-initialize driver
-        self.driver = AsyncGraphDatabase.driver(self.uri, auth=(self.user, self.password))
+        self.driver = self._create_driver()
         
-        # Verify connectivity
-        if await self.verify_connectivity_async():
+        # Closing the old driver and verifying the new one are independent, so overlap them
+        connected, _ = await asyncio.gather(
+            self.verify_connectivity_async(),
+            self._close_driver(old_driver),
+        )
+        if connected:
             console.print(f"[bold bright_green]✅ Connected to Neo4j at {self.uri}[/bold bright_green]")
             console.print(f"[bold bright_blue]📊 Using database: {self.database}[/bold bright_blue]")
         else:
@@ -165,37 +238,18 @@ class Neo4jHandler:
             try:
                 async with self.driver.session(database=self.database) as session:
                     result = await session.run(query, parameters or {})
-                    # Fetch all records
-                    records_list = [record async for record in result]
                     
+                    # Convert each record as it arrives; the driver already prefetches
+                    # fetch_size records in the background, so no intermediate list is needed
                     records = []
-                    for record in records_list:
-                        # Convert Neo4j record to dictionary
+                    converters = _VALUE_CONVERTERS
+                    async for record in result:
+                        # Convert Neo4j types to Python types via the per-class converter
                         record_dict = {}
                         for key in record.keys():
                             value = record[key]
-                            # Convert Neo4j types to Python types
-                            if hasattr(value, '__class__'):
-                                if value.__class__.__name__ == 'Node':
-                                    record_dict[key] = {
-                                        'type': 'Node',
-                                        'id': value.id,
-                                        'labels': list(value.labels),
-                                        'properties': dict(value)
-                                    }
-                                elif value.__class__.__name__ == 'Relationship':
-                                    record_dict[key] = {
-                                        'type': 'Relationship',
-                                        'id': value.id,
-                                        'type_name': value.type,
-                                        'start_node': value.start_node.id,
-                                        'end_node': value.end_node.id,
-                                        'properties': dict(value)
-                                    }
-                                else:
-                                    record_dict[key] = value
-                            else:
-                                record_dict[key] = value
+                            convert = converters.get(value.__class__) or _converter_for(value.__class__)
+                            record_dict[key] = convert(value)
                         records.append(record_dict)
                     return records
                     
@@ -249,6 +303,28 @@ class Neo4jHandler:
         # Should not reach here
         raise Neo4jQueryError(f"Query failed: {last_error}")
     
+    def execute_queries_batch(self, statement: str, params_list: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """Synchronous wrapper for execute_queries_batch_async."""
+        return asyncio.run(self.execute_queries_batch_async(statement, params_list))
+
+    async def execute_queries_batch_async(self, statement: str, params_list: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        """
+        Execute one Cypher statement for many parameter maps in a single round-trip.
+        
+        The statement runs once under ``UNWIND $rows AS row``, so it must read its
+        per-item values from ``row`` (e.g. ``MERGE (p:Person {name: row.name})``).
+        
+        Args:
+            statement: Cypher statement referencing ``row``
+            params_list: One parameter map per item
+            
+        Returns:
+            List of result records as dictionaries
+        """
+        if not params_list:
+            return []
+        return await self.execute_query_async(f"UNWIND $rows AS row\n{statement}", {"rows": params_list})
+    
     def format_results(self, results: list[dict[str, Any]]) -> str:
         """
         Format query results for display.
@@ -276,32 +352,15 @@ class Neo4jHandler:
         if not all_keys:
             return "Empty results."
         
-        # Add columns
-        for key in sorted(all_keys):
+        # Sort once; the same column order is reused for every row
+        columns = sorted(all_keys)
+        for key in columns:
             table.add_column(key, overflow="fold")
         
         # Add rows
+        format_value = self._format_value
         for record in results:
-            row_values = []
-            for key in sorted(all_keys):
-                value = record.get(key, "")
-                # Format complex types
-                if isinstance(value, dict):
-                    if value.get('type') == 'Node':
-                        labels = ':'.join(value.get('labels', []))
-                        props = ', '.join([f"{k}: {v}" for k, v in value.get('properties', {}).items()])
-                        row_values.append(f"({labels} {{{props}}})")
-                    elif value.get('type') == 'Relationship':
-                        rel_type = value.get('type_name', '')
-                        props = ', '.join([f"{k}: {v}" for k, v in value.get('properties', {}).items()])
-                        row_values.append(f"-[{rel_type} {{{props}}}]->")
-                    else:
-                        row_values.append(str(value))
-                elif isinstance(value, list):
-                    row_values.append(str(value))
-                else:
-                    row_values.append(str(value))
-            table.add_row(*row_values)
+            table.add_row(*[format_value(record.get(key, "")) for key in columns])
         
         # Display the table
         console.print(table)
@@ -312,14 +371,32 @@ class Neo4jHandler:
         # Let's just print it and return a summary.
         return f"{len(results)} record(s) returned."
     
+    @staticmethod
+    def _format_value(value: Any) -> str:
+        """Render a single result value as a table cell."""
+        if value.__class__ is str:
+            return value
+        if isinstance(value, dict):
+            kind = value.get('type')
+            if kind == 'Node' or kind == 'Relationship':
+                props = ', '.join([f"{k}: {v}" for k, v in value.get('properties', {}).items()])
+                if kind == 'Node':
+                    return f"({':'.join(value.get('labels', []))} {{{props}}})"
+                return f"-[{value.get('type_name', '')} {{{props}}}]->"
+        return str(value)
+
     def close(self):
         """Synchronous wrapper for close_async."""
         asyncio.run(self.close_async())
 
     async def close_async(self):
         """Close the database connection asynchronously."""
-        if self.driver:
-            await self.driver.close()
+        await self._close_driver(self.driver)
+
+    async def _close_driver(self, driver: Optional[AsyncDriver]):
+        """Close the given driver, if any."""
+        if driver:
+            await driver.close()
             console.print("[bold bright_blue]🔌 Disconnected from Neo4j[/bold bright_blue]")
     
     def __enter__(self):
@@ -1,6 +1,9 @@
+import io
 import pytest
 import asyncio
 from unittest.mock import MagicMock, patch
+from rich.console import Console
+from graphbot.handlers import neo4j_handler
 from graphbot.handlers.neo4j_handler import Neo4jHandler
 
 # Re-using the fake classes structure from the previous stack test as it mocks internal driver behavior well
@@ -31,14 +34,14 @@ class FakeRecord:
 class FakeResult:
     def __init__(self, records):
         self._records = records
-        self._iter = iter(self._records)
     def __aiter__(self):
-        return self
-    async def __anext__(self):
-        try:
-            return next(self._iter)
-        except StopIteration:
-            raise StopAsyncIteration
+        # Fresh iterator per consumer so a result can be replayed
+        return self._iterate()
+    async def _iterate(self):
+        for record in self._records:
+            # Suspend like a network fetch so consumers must not assume synchronous delivery
+            await asyncio.sleep(0)
+            yield record
     def single(self):
         return self._records[0]
 
@@ -46,7 +49,9 @@ class FakeSession:
     def __init__(self, result=None, exc=None):
         self._result = result
         self._exc = exc
+        self.calls = []
     async def run(self, query, parameters=None):
+        self.calls.append((query, parameters))
         if self._exc:
             raise self._exc
         return self._result
@@ -76,15 +81,35 @@ def handler(monkeypatch):
     neo.driver = MagicMock()
     return neo
 
-def test_execute_query_transforms_records(handler):
-    record = FakeRecord(
+@pytest.fixture(scope="session")
+def _shared_fake_driver():
+    """One fake session/driver pair reused by every test that needs a driver."""
+    return FakeDriver(FakeSession())
+
+@pytest.fixture
+def fake_driver(_shared_fake_driver):
+    """Factory that re-arms the shared fake driver with the given records or error."""
+    session = _shared_fake_driver._session
+    def _make(records=None, exc=None):
+        session._result = FakeResult(records or [])
+        session._exc = exc
+        session.calls = []
+        return _shared_fake_driver
+    return _make
+
+@pytest.fixture(scope="session")
+def alice_record():
+    """Read-only record shared by tests that only inspect the transformation."""
+    return FakeRecord(
         {
             "n": Node(1, ["Person"], {"name": "Alice"}),
             "r": Relationship(2, "KNOWS", 1, 2, {"since": 2020}),
             "value": 5,
         }
     )
-    handler.driver = FakeDriver(FakeSession(result=FakeResult([record])))
+
+def test_execute_query_transforms_records(handler, fake_driver, alice_record):
+    handler.driver = fake_driver(records=[alice_record])
 
     # Note: execute_query is synchronous wrapper in the original code? 
     # Let's check if the method is async or sync. 
@@ -118,21 +143,20 @@ def test_execute_query_transforms_records(handler):
     assert results[0]["r"]["type_name"] == "KNOWS"
     assert results[0]["value"] == 5
 
-def test_execute_query_raises_on_failure(handler):
-    handler.driver = FakeDriver(FakeSession(exc=RuntimeError("db down")))
+def test_execute_query_raises_on_failure(handler, fake_driver):
+    handler.driver = fake_driver(exc=RuntimeError("db down"))
 
     with pytest.raises(RuntimeError):
         handler.execute_query("MATCH (n) RETURN n")
 
-def test_execute_query_handles_empty_results(handler):
+def test_execute_query_handles_empty_results(handler, fake_driver):
     """Test that empty result sets are handled correctly."""
-    empty_result = FakeResult([])
-    handler.driver = FakeDriver(FakeSession(result=empty_result))
+    handler.driver = fake_driver(records=[])
 
     results = handler.execute_query("MATCH (n) WHERE false RETURN n")
     assert results == []
 
-def test_execute_query_transforms_complex_records(handler):
+def test_execute_query_transforms_complex_records(handler, fake_driver):
     """Test transformation of complex Neo4j record types."""
     # Test with Path objects, DateTime, etc.
     record = FakeRecord({
@@ -142,7 +166,7 @@ def test_execute_query_transforms_complex_records(handler):
         "array": [1, 2, 3],
         "null_value": None
     })
-    handler.driver = FakeDriver(FakeSession(result=FakeResult([record])))
+    handler.driver = fake_driver(records=[record])
 
     results = handler.execute_query("MATCH p=()-->() RETURN p, datetime(), point({x:1,y:2}), [1,2,3], null")
 
@@ -153,6 +177,36 @@ def test_execute_query_transforms_complex_records(handler):
     assert results[0]["array"] == [1, 2, 3]
     assert results[0]["null_value"] is None
 
+def test_execute_query_streams_records_in_order(handler, fake_driver):
+    """Test that records are converted in arrival order across many suspensions."""
+    handler.driver = fake_driver(records=[FakeRecord({"i": i}) for i in range(250)])
+
+    results = handler.execute_query("UNWIND range(0, 249) AS i RETURN i")
+
+    assert results == [{"i": i} for i in range(250)]
+
+def test_execute_queries_batch_uses_single_unwind_round_trip(handler, fake_driver):
+    """Test that batched parameter maps are sent as one UNWIND statement."""
+    handler.driver = fake_driver(records=[FakeRecord({"created": 2})])
+    session = handler.driver._session
+    rows = [{"name": "Alice"}, {"name": "Bob"}]
+
+    results = handler.execute_queries_batch("MERGE (p:Person {name: row.name}) RETURN count(p) AS created", rows)
+
+    assert results == [{"created": 2}]
+    assert len(session.calls) == 1
+    query, params = session.calls[0]
+    assert query.startswith("UNWIND $rows AS row")
+    assert params == {"rows": rows}
+
+def test_execute_queries_batch_skips_empty_input(handler, fake_driver):
+    """Test that an empty batch does not hit the database."""
+    handler.driver = fake_driver()
+    session = handler.driver._session
+
+    assert handler.execute_queries_batch("MERGE (p:Person {name: row.name})", []) == []
+    assert session.calls == []
+
 def test_format_results_with_various_data_types(handler):
     """Test formatting of results with different data types."""
     # Create records with various data types
@@ -167,6 +221,25 @@ def test_format_results_with_various_data_types(handler):
     assert "30" in formatted
     assert "95.5" in formatted
 
+def test_format_results_renders_graph_values(handler, monkeypatch):
+    """Test that nodes, relationships and primitives render into the printed table."""
+    output = io.StringIO()
+    monkeypatch.setattr(neo4j_handler, "console", Console(file=output, width=200))
+    records = [
+        {
+            "n": {"type": "Node", "labels": ["Person"], "properties": {"name": "Alice"}},
+            "r": {"type": "Relationship", "type_name": "KNOWS", "properties": {"since": 2020}},
+            "count": 3,
+        },
+        {"n": "plain", "count": None},
+    ]
+
+    assert handler.format_results(records) == "2 record(s) returned."
+    rendered = output.getvalue()
+    assert "(Person {name: Alice})" in rendered
+    assert "-[KNOWS {since: 2020}]->" in rendered
+    assert "plain" in rendered and "None" in rendered
+
 def test_format_results_empty_input(handler):
     """Test formatting when no results are provided."""
     formatted = handler.format_results([])
@@ -209,6 +282,52 @@ def test_connect_async_updates_credentials(handler):
         assert handler.password == "testpass"
         assert handler.database == "testdb"
 
+def test_connect_async_overlaps_close_and_verify(handler):
+    """Test that closing the old driver and verifying the new one run concurrently."""
+    calls = []
+
+    class TrackingDriver:
+        def __init__(self, name):
+            self.name = name
+        async def verify_connectivity(self):
+            calls.append(f"{self.name}:verify:start")
+            await asyncio.sleep(0)
+            calls.append(f"{self.name}:verify:end")
+        async def close(self):
+            calls.append(f"{self.name}:close:start")
+            await asyncio.sleep(0)
+            calls.append(f"{self.name}:close:end")
+
+    handler.driver = TrackingDriver("old")
+    new_driver = TrackingDriver("new")
+
+    with patch('graphbot.handlers.neo4j_handler.AsyncGraphDatabase.driver', return_value=new_driver) as make_driver:
+        asyncio.run(handler.connect_async("bolt://test:7687", "testuser", "testpass"))
+
+    assert handler.driver is new_driver
+    assert calls == [
+        "new:verify:start",
+        "old:close:start",
+        "new:verify:end",
+        "old:close:end",
+    ]
+    kwargs = make_driver.call_args.kwargs
+    assert kwargs["auth"] == ("testuser", "testpass")
+    assert "max_connection_pool_size" in kwargs
+    assert "connection_acquisition_timeout" in kwargs
+
+def test_create_driver_ignores_malformed_pool_settings(handler, monkeypatch):
+    """Test that bad pool settings in the environment fall back to the defaults."""
+    monkeypatch.setenv("NEO4J_MAX_POOL_SIZE", "lots")
+    monkeypatch.setenv("NEO4J_ACQUISITION_TIMEOUT", "15.5")
+
+    with patch('graphbot.handlers.neo4j_handler.AsyncGraphDatabase.driver') as make_driver:
+        handler._create_driver()
+
+    kwargs = make_driver.call_args.kwargs
+    assert kwargs["max_connection_pool_size"] == 100
+    assert kwargs["connection_acquisition_timeout"] == 15.5
+
 def test_connect_async_without_database(handler):
     """Test connect_async when no database is specified."""
     async def mock_verify():
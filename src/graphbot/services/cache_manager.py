@@ -5,10 +5,13 @@ Provides thread-safe caching with expiration, size limits, and management capabi
 """
 import os
 import json
+import atexit
 import time
+import heapq
 import hashlib
 import threading
-from typing import Any, Optional
+from collections import OrderedDict
+from typing import Any, Callable, Optional
 from dataclasses import dataclass
 from rich.console import Console
 
@@ -23,15 +26,26 @@ class CacheEntry:
     timestamp: float
     access_count: int = 0
     last_accessed: float = 0.0
+    data_size: int = 0
 
-    def is_expired(self, max_age: int) -> bool:
-        """Check if cache entry has expired."""
-        return time.time() - self.timestamp > max_age
+    def is_expired(self, max_age: int, now: Optional[float] = None) -> bool:
+        """Check if cache entry has expired as of now (defaults to the current time)."""
+        return (time.time() if now is None else now) - self.timestamp > max_age
 
-    def touch(self):
+    def touch(self, now: Optional[float] = None):
         """Update access metadata."""
         self.access_count += 1
-        self.last_accessed = time.time()
+        self.last_accessed = time.time() if now is None else now
+
+
+def _serialized_size(data: Any) -> int:
+    """Size of the JSON encoding of data, measured once when it is cached."""
+    if not data:
+        return 0
+    try:
+        return len(json.dumps(data))
+    except (TypeError, ValueError):
+        return 0
 
 
 class CacheManager:
@@ -39,53 +53,88 @@ class CacheManager:
     Centralized cache manager with expiration, size limits, and thread safety.
     """
 
-    def __init__(self, cache_file: str = ".graphbot_cache.json",
+    def __init__(self, cache_file: Optional[str] = ".graphbot_cache.json",
                  max_age_hours: int = 24,
-                 max_entries: int = 100):
+                 max_entries: int = 100,
+                 flush_interval: float = 60.0,
+                 clock: Callable[[], float] = time.time):
         """
         Initialize cache manager.
 
         Args:
-            cache_file: Path to cache file
+            cache_file: Path to cache file, or None to keep the cache in memory only
             max_age_hours: Maximum age of cache entries in hours
             max_entries: Maximum number of cache entries
+            flush_interval: Seconds between background saves of pending changes
+            clock: Source of the current time in seconds, replaceable in tests
         """
         self.cache_file = cache_file
+        self._clock = clock
         self.max_age_seconds = max_age_hours * 3600
         self.max_entries = max_entries
+        self.flush_interval = flush_interval
         self._lock = threading.RLock()
         self._dirty = False
-        self._cache: dict[str, CacheEntry] = {}
+        # Ordered least- to most-recently used for O(1) LRU eviction
+        self._cache: OrderedDict[str, CacheEntry] = OrderedDict()
+        # Min-heap of (expiry_time, key) so expiration only touches due entries
+        self._expiry_heap: list[tuple[float, str]] = []
+        # Running aggregates so get_stats never scans the entries
+        self._total_accesses = 0
+        self._timestamp_sum = 0.0
+        self._newest_timestamp: Optional[float] = None
+        self._stop_flush = threading.Event()
+        self._flush_thread: Optional[threading.Thread] = None
+        if cache_file is None:
+            return
         self._load_cache()
 
+        # Writes only mark the cache dirty; a daemon thread coalesces them into periodic saves
+        self._flush_thread = threading.Thread(
+            target=self._flush_loop, name="graphbot-cache-flush", daemon=True
+        )
+        self._flush_thread.start()
+        atexit.register(self.save_if_dirty)
+
     def _load_cache(self):
         """Load cache from file."""
         if not os.path.exists(self.cache_file):
             return
 
         try:
-            with open(self.cache_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-            # Reconstruct CacheEntry objects
-            for key, entry_data in data.get('entries', {}).items():
-                self._cache[key] = CacheEntry(
+            # json.loads accepts UTF-8 bytes directly, skipping the text-mode decode layer
+            with open(self.cache_file, 'rb') as f:
+                data = json.loads(f.read())
+
+            # Reconstruct CacheEntry objects in LRU order
+            entries = sorted(
+                data.get('entries', {}).items(),
+                key=lambda item: item[1].get('last_accessed', item[1]['timestamp'])
+            )
+            for key, entry_data in entries:
+                self._add_entry(CacheEntry(
                     key=key,
                     data=entry_data['data'],
                     timestamp=entry_data['timestamp'],
                     access_count=entry_data.get('access_count', 0),
-                    last_accessed=entry_data.get('last_accessed', entry_data['timestamp'])
-                )
+                    last_accessed=entry_data.get('last_accessed', entry_data['timestamp']),
+                    data_size=entry_data.get('data_size') or _serialized_size(entry_data['data'])
+                ))
 
             console.print(f"[dim]Loaded {len(self._cache)} cache entries from {self.cache_file}[/dim]")
 
         except Exception as e:
             console.print(f"[yellow]Warning: Could not load cache file {self.cache_file}: {e}[/yellow]")
             # Start with empty cache if file is corrupted
-            self._cache = {}
+            self._cache = OrderedDict()
+            self._expiry_heap = []
+            self._recompute_stats()
 
     def _save_cache(self):
         """Save cache to file."""
+        if self.cache_file is None:
+            self._dirty = False
+            return
         try:
             # Convert CacheEntry objects to serializable dicts
             entries = {}
@@ -94,60 +143,152 @@ class CacheManager:
                     'data': entry.data,
                     'timestamp': entry.timestamp,
                     'access_count': entry.access_count,
-                    'last_accessed': entry.last_accessed
+                    'last_accessed': entry.last_accessed,
+                    'data_size': entry.data_size
                 }
 
             data = {
                 'version': '1.0',
-                'created': time.time(),
+                'created': self._clock(),
                 'entries': entries
             }
 
-            # Write to temporary file first, then rename for atomicity
-            temp_file = self.cache_file + '.tmp'
-            with open(temp_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            # Compact separators keep the file small; it is machine-read only
+            payload = json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
 
-            os.rename(temp_file, self.cache_file)
+            # Write and fsync a temporary file first, then replace for atomicity
+            temp_file = self.cache_file + '.tmp'
+            try:
+                with open(temp_file, 'wb') as f:
+                    f.write(payload)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(temp_file, self.cache_file)
+            except BaseException:
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
+                raise
+
+            self._fsync_cache_dir()
             self._dirty = False
 
         except Exception as e:
             console.print(f"[yellow]Warning: Could not save cache file {self.cache_file}: {e}[/yellow]")
 
-    def _cleanup_expired(self):
-        """Remove expired entries."""
-        expired_keys = [
-            key for key, entry in self._cache.items()
-            if entry.is_expired(self.max_age_seconds)
-        ]
+    def _fsync_cache_dir(self):
+        """Persist the rename itself by syncing the containing directory (POSIX only)."""
+        if not hasattr(os, 'O_DIRECTORY'):
+            return
+        dir_fd = os.open(os.path.dirname(self.cache_file) or '.', os.O_DIRECTORY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def _add_entry(self, entry: CacheEntry):
+        """Insert entry as most recently used, keeping the heap and aggregates in sync."""
+        if entry.key in self._cache:
+            self._remove_entry(entry.key)
+
+        self._cache[entry.key] = entry
+        heapq.heappush(self._expiry_heap, (entry.timestamp + self.max_age_seconds, entry.key))
+        # Overwritten and evicted keys leave stale items behind; shed them once they dominate
+        if len(self._expiry_heap) > 2 * len(self._cache):
+            self._rebuild_expiry_heap()
+
+        self._total_accesses += entry.access_count
+        self._timestamp_sum += entry.timestamp
+        if self._newest_timestamp is None or entry.timestamp > self._newest_timestamp:
+            self._newest_timestamp = entry.timestamp
+
+    def _remove_entry(self, key: str) -> CacheEntry:
+        """Remove an entry and subtract it from the aggregates."""
+        entry = self._cache.pop(key)
+
+        self._total_accesses -= entry.access_count
+        self._timestamp_sum -= entry.timestamp
+        # Only rescan when the newest entry itself left, which LRU eviction rarely does
+        if entry.timestamp >= self._newest_timestamp:
+            self._newest_timestamp = max(
+                (e.timestamp for e in self._cache.values()), default=None
+            )
+        return entry
+
+    def _rebuild_expiry_heap(self):
+        """Rebuild the expiry heap from the live entries, dropping stale items."""
+        max_age = self.max_age_seconds
+        self._expiry_heap = [(entry.timestamp + max_age, key) for key, entry in self._cache.items()]
+        heapq.heapify(self._expiry_heap)
+
+    def _recompute_stats(self):
+        """Rebuild the aggregates from scratch, discarding accumulated float drift."""
+        self._total_accesses = sum(e.access_count for e in self._cache.values())
+        self._timestamp_sum = sum(e.timestamp for e in self._cache.values())
+        self._newest_timestamp = max((e.timestamp for e in self._cache.values()), default=None)
+
+    def _oldest_timestamp(self) -> Optional[float]:
+        """Timestamp of the oldest live entry, read off the top of the expiry heap."""
+        heap = self._expiry_heap
+        while heap:
+            expiry, key = heap[0]
+            entry = self._cache.get(key)
+            if entry and entry.timestamp + self.max_age_seconds == expiry:
+                return entry.timestamp
+            # Stale item for an overwritten or removed key
+            heapq.heappop(heap)
+        return None
+
+    def _cleanup_expired(self, now: Optional[float] = None):
+        """Remove expired entries whose expiry time has come due."""
+        if now is None:
+            now = self._clock()
+        removed = 0
+
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            _, key = heapq.heappop(self._expiry_heap)
+            entry = self._cache.get(key)
+            # Skip stale heap items left behind by overwritten or removed keys
+            if entry and entry.timestamp + self.max_age_seconds <= now:
+                self._remove_entry(key)
+                removed += 1
+
+        if removed:
+            console.print(f"[dim]Cleaned up {removed} expired cache entries[/dim]")
 
-        for key in expired_keys:
-            del self._cache[key]
+    def _maintenance(self):
+        """Drop expired entries and trim to max_entries in a single pass (maintenance only).
 
-        if expired_keys:
-            console.print(f"[dim]Cleaned up {len(expired_keys)} expired cache entries[/dim]")
+        Survivors keep their LRU order; the expiry heap and running aggregates
+        are rebuilt from them, which also sheds stale heap items and float drift.
+        """
+        now = self._clock()
+        max_age = self.max_age_seconds
+        live = [(key, entry) for key, entry in self._cache.items()
+                if now - entry.timestamp <= max_age]
+        expired = len(self._cache) - len(live)
+        # The cache is ordered least- to most-recently used, so excess survivors lead the list
+        evicted = max(0, len(live) - self.max_entries)
+        if evicted:
+            live = live[evicted:]
+
+        self._cache = OrderedDict(live)
+        self._rebuild_expiry_heap()
+        self._recompute_stats()
+
+        if expired:
+            console.print(f"[dim]Cleaned up {expired} expired cache entries[/dim]")
+        if evicted:
+            console.print(f"[dim]Evicted {evicted} cache entries due to size limit[/dim]")
 
     def _enforce_size_limit(self):
         """Enforce maximum cache size using LRU eviction."""
-        if len(self._cache) <= self.max_entries:
-            return
-
-        # Sort by last accessed time (oldest first)
-        entries = sorted(
-            self._cache.items(),
-            key=lambda x: x[1].last_accessed
-        )
-
-        # Remove oldest entries
-        to_remove = len(self._cache) - self.max_entries
-        removed_keys = []
+        evicted = 0
+        while len(self._cache) > self.max_entries:
+            self._remove_entry(next(iter(self._cache)))
+            evicted += 1
 
-        for key, _ in entries[:to_remove]:
-            del self._cache[key]
-            removed_keys.append(key)
-
-        if removed_keys:
-            console.print(f"[dim]Evicted {len(removed_keys)} cache entries due to size limit[/dim]")
+        if evicted:
+            console.print(f"[dim]Evicted {evicted} cache entries due to size limit[/dim]")
 
     def get(self, key: str) -> Optional[Any]:
         """
@@ -160,15 +301,18 @@ class CacheManager:
             Cached data or None if not found/expired
         """
         with self._lock:
-            self._cleanup_expired()
+            now = self._clock()
+            self._cleanup_expired(now)
 
             entry = self._cache.get(key)
-            if entry and not entry.is_expired(self.max_age_seconds):
-                entry.touch()
+            if entry and not entry.is_expired(self.max_age_seconds, now):
+                entry.touch(now)
+                self._total_accesses += 1
+                self._cache.move_to_end(key)
                 return entry.data
             elif entry:
                 # Remove expired entry
-                del self._cache[key]
+                self._remove_entry(key)
 
             return None
 
@@ -181,16 +325,18 @@ class CacheManager:
             data: Data to cache
         """
         with self._lock:
-            self._cleanup_expired()
+            now = self._clock()
+            self._cleanup_expired(now)
 
             entry = CacheEntry(
                 key=key,
                 data=data,
-                timestamp=time.time()
+                timestamp=now,
+                data_size=_serialized_size(data)
             )
-            entry.touch()
+            entry.touch(now)
 
-            self._cache[key] = entry
+            self._add_entry(entry)
             self._enforce_size_limit()
             self._dirty = True
             # self._save_cache() # Optimized: Don't save on every put
@@ -207,8 +353,8 @@ class CacheManager:
         """
         with self._lock:
             if key in self._cache:
-                del self._cache[key]
-                self._save_cache()
+                self._remove_entry(key)
+                self._dirty = True
                 return True
             return False
 
@@ -216,13 +362,16 @@ class CacheManager:
         """Clear all cache entries."""
         with self._lock:
             self._cache.clear()
-            self._save_cache()
+            self._expiry_heap.clear()
+            self._recompute_stats()
+            self._dirty = True
             console.print("[dim]Cache cleared[/dim]")
 
     def get_stats(self) -> dict[str, Any]:
         """Get cache statistics."""
         with self._lock:
-            self._cleanup_expired()
+            now = self._clock()
+            self._cleanup_expired(now)
 
             total_entries = len(self._cache)
             if total_entries == 0:
@@ -234,30 +383,28 @@ class CacheManager:
                     'total_accesses': 0
                 }
 
-            timestamps = [entry.timestamp for entry in self._cache.values()]
-            access_counts = [entry.access_count for entry in self._cache.values()]
-
             return {
                 'total_entries': total_entries,
-                'oldest_entry': min(timestamps),
-                'newest_entry': max(timestamps),
-                'average_age': time.time() - sum(timestamps) / len(timestamps),
-                'total_accesses': sum(access_counts)
+                'oldest_entry': self._oldest_timestamp(),
+                'newest_entry': self._newest_timestamp,
+                'average_age': now - self._timestamp_sum / total_entries,
+                'total_accesses': self._total_accesses
             }
 
     def list_entries(self) -> list[dict[str, Any]]:
         """List all cache entries with metadata."""
         with self._lock:
-            self._cleanup_expired()
+            now = self._clock()
+            self._cleanup_expired(now)
 
             entries = []
             for key, entry in self._cache.items():
                 entries.append({
                     'key': key,
-                    'age_seconds': time.time() - entry.timestamp,
+                    'age_seconds': now - entry.timestamp,
                     'access_count': entry.access_count,
                     'last_accessed': entry.last_accessed,
-                    'data_size': len(json.dumps(entry.data)) if entry.data else 0
+                    'data_size': entry.data_size
                 })
 
             # Sort by last accessed (most recent first)
@@ -267,8 +414,7 @@ class CacheManager:
         """Perform maintenance cleanup."""
         with self._lock:
             old_count = len(self._cache)
-            self._cleanup_expired()
-            self._enforce_size_limit()
+            self._maintenance()
             new_count = len(self._cache)
 
             if old_count != new_count or self._dirty:
@@ -281,6 +427,18 @@ class CacheManager:
             if self._dirty:
                 self._save_cache()
 
+    def _flush_loop(self):
+        """Background loop persisting pending changes every flush_interval seconds."""
+        while not self._stop_flush.wait(self.flush_interval):
+            self.save_if_dirty()
+
+    def close(self):
+        """Stop the background flusher and persist pending changes."""
+        self._stop_flush.set()
+        if self._flush_thread is not None:
+            atexit.unregister(self.save_if_dirty)
+        self.save_if_dirty()
+
 
 # Global cache manager instance
 _cache_manager = None
@@ -316,4 +474,5 @@ def create_cache_key(uri: str, database: str, context: str = "") -> str:
         key_parts.append(context)
 
     key_string = "|".join(key_parts)
-    return hashlib.md5(key_string.encode()).hexdigest()
+    # BLAKE2b with a 16-byte digest keeps the 32-hex-char key width of MD5
+    return hashlib.blake2b(key_string.encode('utf-8'), digest_size=16).hexdigest()
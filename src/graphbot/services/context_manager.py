@@ -1,9 +1,26 @@
+import hashlib
 import logging
-from typing import Optional
+from typing import Optional, Union
 from graphbot.services.llm import LLMProvider
 
 logger = logging.getLogger(__name__)
 
+# Token count memo: bounded size, and texts longer than this are keyed by digest
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_INLINE_KEY_CHARS = 256
+
+# Tokens reserved for the model's answer
+OUTPUT_BUFFER_TOKENS = 1000
+# History is only added while more than this many tokens remain
+MIN_HISTORY_TOKENS = 100
+# Character counts stand in for token counts only at this many tokens per character.
+# Ordinary text tokenizes to well under one token per character, but byte fallback for
+# emoji and rare CJK can exceed it, so the shortcut is a heuristic with a safety margin.
+CHAR_TOKEN_MARGIN = 2
+
+# Pre-uppercased role labels for history formatting
+_ROLE_UPPER = {'user': 'USER', 'assistant': 'ASSISTANT', 'system': 'SYSTEM'}
+
 class ContextManager:
     """
     Manages context window usage, including truncation and token counting.
@@ -13,6 +30,13 @@ class ContextManager:
         self.provider = provider
         self.max_tokens = max_tokens
         self.strategy = strategy
+        self._token_cache: dict[Union[str, bytes], int] = {}
+
+    def _token_cache_key(self, text: str) -> Union[str, bytes]:
+        """Key short texts directly and long ones by digest to bound memo memory."""
+        if len(text) <= TOKEN_CACHE_INLINE_KEY_CHARS:
+            return text
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
 
     async def _safe_count_tokens(self, text: str) -> int:
         """
@@ -26,12 +50,23 @@ class ContextManager:
         """
         if not text:
             return 0
+
+        # System prompts and schema strings repeat across calls; skip the provider RTT
+        key = self._token_cache_key(text)
+        cached = self._token_cache.get(key)
+        if cached is not None:
+            return cached
+
         try:
-            return await self.provider.count_tokens(text)
+            count = await self.provider.count_tokens(text)
         except Exception as e:
             logger.warning(f"Token counting failed, using estimate: {e}")
-            # Fallback: rough estimate of ~4 chars per token
-            return len(text) // 4
+            return self._estimate_tokens(text)
+
+        if len(self._token_cache) >= TOKEN_CACHE_SIZE:
+            self._token_cache.pop(next(iter(self._token_cache)))
+        self._token_cache[key] = count
+        return count
 
     async def prepare_prompt(self, 
                              user_input: str, 
@@ -53,13 +88,25 @@ class ContextManager:
         """
         
         try:
+            # When the margin-scaled character lengths fit the budget nothing would be truncated,
+            # so every tokenizer round-trip is skipped (heuristic; see CHAR_TOKEN_MARGIN)
+            history_text = self._format_history(history) if history else ""
+            if history_text is None:
+                # Malformed history is dropped rather than failing the whole prompt
+                history, history_text = None, ""
+            slack = self.max_tokens - OUTPUT_BUFFER_TOKENS - CHAR_TOKEN_MARGIN * (
+                len(system_instruction or "") + len(user_input) + len(context_data or "")
+            )
+            if slack >= CHAR_TOKEN_MARGIN * len(history_text) and (not history or slack > MIN_HISTORY_TOKENS):
+                history_str = "\nConversation History:\n" + history_text if history else ""
+                return self._assemble_prompt(user_input, context_data or "", history_str)
+
             # 1. Estimate base tokens with safe counting
             system_tokens = await self._safe_count_tokens(system_instruction) if system_instruction else 0
             user_tokens = await self._safe_count_tokens(user_input)
             
             # Reserve some buffer for the answer
-            output_buffer = 1000 
-            available_tokens = self.max_tokens - output_buffer - system_tokens - user_tokens
+            available_tokens = self.max_tokens - OUTPUT_BUFFER_TOKENS - system_tokens - user_tokens
             
             if available_tokens < 0:
                 logger.warning("User input + system instruction exceed token limit! Truncating user input.")
@@ -83,14 +130,16 @@ class ContextManager:
                     available_tokens = 0
 
             final_history_str = ""
-            if history and available_tokens > 100:
+            if history and available_tokens > MIN_HISTORY_TOKENS:
                 try:
                     # Add history if space remains
-                    # Format history as text
-                    history_text = "\n".join([f"{msg['role'].upper()}: {msg['content']}" for msg in history])
-                    history_tokens = await self._safe_count_tokens(history_text)
+                    # A history well inside the remaining budget by character count is taken
+                    # without a tokenizer call (heuristic; see CHAR_TOKEN_MARGIN)
+                    fits = CHAR_TOKEN_MARGIN * len(history_text) <= available_tokens
+                    if not fits:
+                        fits = await self._safe_count_tokens(history_text) <= available_tokens
                     
-                    if history_tokens <= available_tokens:
+                    if fits:
                         final_history_str = "\nConversation History:\n" + history_text
                     else:
                         # Take last N chars that fit
@@ -106,26 +155,42 @@ class ContextManager:
                     logger.warning(f"Failed to process history: {e}")
                     final_history_str = ""
 
-            # Assemble final parts
-            parts = []
-            if final_context:
-                parts.append(f"### CONTEXT:\n{final_context}\n")
-            
-            if final_history_str:
-                parts.append(final_history_str)
-                
-            parts.append(f"\nUser Input: {user_input}")
-            
-            return "\n".join(parts)
+            return self._assemble_prompt(user_input, final_context, final_history_str)
             
         except Exception as e:
             # Fallback: return minimal prompt if something goes wrong
             logger.error(f"Error preparing prompt: {e}")
             return f"User Input: {user_input}"
 
+    @staticmethod
+    def _format_history(history: list[dict[str, str]]) -> Optional[str]:
+        """Format history as 'ROLE: content' lines, or return None if a message is malformed."""
+        try:
+            return "\n".join(
+                f"{_ROLE_UPPER.get(msg['role']) or msg['role'].upper()}: {msg['content']}"
+                for msg in history
+            )
+        except Exception as e:
+            logger.warning(f"Failed to process history: {e}")
+            return None
+
+    @staticmethod
+    def _assemble_prompt(user_input: str, final_context: str, final_history_str: str) -> str:
+        """Join the context, history and user input sections into the final prompt."""
+        parts = []
+        if final_context:
+            parts.append(f"### CONTEXT:\n{final_context}\n")
+        
+        if final_history_str:
+            parts.append(final_history_str)
+            
+        parts.append(f"\nUser Input: {user_input}")
+        
+        return "\n".join(parts)
+
     def _estimate_tokens(self, text: str) -> int:
         """
-        Estimate token count based on character length.
+        Estimate token count based on character length (~4 chars per token).
         
         Args:
             text: Text to estimate tokens for
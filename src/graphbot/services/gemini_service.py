@@ -1,27 +1,214 @@
 """Gemini API service for natural language to Cypher query conversion."""
 import os
 import re
+import json
+import math
+import time
+import logging
 import asyncio
+import sqlite3
 import hashlib
-from typing import Optional, Dict
+import threading
+from collections import OrderedDict, deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
 import google.generativeai as genai
 from dotenv import load_dotenv
 from rich.console import Console
 
-# Load environment variables from .env or config.env
-load_dotenv()  # Try .env first
-config_file = os.getenv("CONFIG_FILE", "config/config.env")
-if os.path.exists(config_file):
-    load_dotenv(config_file)  # Load config.env if it exists
-
 console = Console()
+logger = logging.getLogger(__name__)
+
+# Maximum explanation requests in flight at once for batch explanation
+EXPLAIN_BATCH_CONCURRENCY = 4
+
+# How long the on-disk model catalog is trusted before list_models is called again
+MODEL_CATALOG_TTL = 24 * 3600
+
+# Consecutive "model not found" errors after which the model catalog is treated as stale
+MODEL_NOT_FOUND_REFRESH_AFTER = 2
+
+# How long generated Cypher is reused from the on-disk query cache
+QUERY_CACHE_TTL = 7 * 24 * 3600
+
+# Part of every on-disk query cache key; bump it when the Cypher prompt changes
+# so queries written for an older prompt are not reused
+CYPHER_PROMPT_VERSION = "1"
+
+# Opt-in semantic cache: embedding model and the cosine similarity that counts as a paraphrase
+EMBEDDING_MODEL = "models/gemini-embedding-001"
+SEMANTIC_CACHE_THRESHOLD = 0.95
+
+# Compiled once: "retry in 12.5s" hints in rate limit errors, and markdown code fences
+_RETRY_RE = re.compile(r'retry in ([\d.]+)s', re.IGNORECASE)
+_FENCE_RE = re.compile(r'^```(?:[\w-]*[ \t]*\n)?|\n?```\s*$')
+
+# Fixed instructions that prefix every Cypher generation prompt
+CYPHER_BASE_PROMPT = """You are an expert Neo4j Cypher Query Developer.
+Your task is to accurately translate the user's natural language request into an executable Cypher query.
+
+### STRICT OUTPUT RULES:
+1. **Raw Text Only**: Output ONLY the Cypher code. Do NOT use markdown blocks (```cypher). Do NOT provide explanations or apologies.
+2. **Syntax**: Use valid Neo4j Cypher syntax.
+
+### QUERY GUIDELINES:
+1. **Fuzzy Matching**: When searching for names or text, use case-insensitive contains (e.g., `WHERE toLower(n.name) CONTAINS toLower('search_term')`) unless searching by exact ID.
+2. **Boolean/Flags**: For flag-like properties (e.g., isFraud, hasError), check multiple formats if schema is ambiguous: `WHERE n.prop = true OR toLower(toString(n.prop)) IN ['yes', '1', 'true']`.
+3. **Safety**: For DELETE operations, ensure you use `DETACH DELETE` if nodes might have relationships.
+4. **Readability**: Always Return relevant, readable properties (e.g., names, IDs, counts) rather than just nodes (`RETURN n`).
+5. **Limits**: For broad queries (e.g., "Show me all nodes"), ALWAYS append `LIMIT 25` to prevent database overloads.
+6. **Logic**:
+   - "How many" -> Use `RETURN count(...)`
+   - "Find connections" -> Use `MATCH p=(a)-[*]->(b) ... RETURN p`
+
+"""
+
+# Fixed prompt heads for each branch, so a request only appends its variable parts
+_CYPHER_PROMPT_SCHEMA_PREFIX = CYPHER_BASE_PROMPT + "\n### DATABASE SCHEMA:\n"
+_CYPHER_PROMPT_REQUEST_PREFIX = CYPHER_BASE_PROMPT + "\nUser request: "
+
+# Appended to a Cypher prompt to get the query and a results explanation from one call.
+# The explanation only depends on the result count, so it is written ahead of execution.
+EXPLANATION_COUNT_PLACEHOLDER = "{count}"
+_FUSED_PROMPT_SUFFIX = f"""
+
+Also write a brief, user-friendly explanation of what the query finds or does, writing the literal
+placeholder {EXPLANATION_COUNT_PLACEHOLDER} wherever the number of results belongs.
+This overrides the raw-text rule above: respond in exactly this format.
+CYPHER:
+<the Cypher query>
+---
+EXPLANATION:
+<the explanation>"""
+# Fused replies are parsed leniently: the "---" separator is optional and a "CYPHER:" label is stripped
+_FUSED_EXPLANATION_RE = re.compile(r'^[ \t]*(?:-{3,}[ \t]*\n\s*)?EXPLANATION:[ \t]*', re.MULTILINE)
+_FUSED_CYPHER_LABEL_RE = re.compile(r'^\s*CYPHER:\s*')
+_FUSED_SEPARATOR_RE = re.compile(r'\n\s*-{3,}\s*$')
+_FUSED_LABEL_RE = re.compile(r'\b(?:CYPHER|EXPLANATION):')
+
+
+def _cache_dir() -> str:
+    """Directory for on-disk caches: GRAPHBOT_CACHE_DIR, or ~/.cache/graphbot by default."""
+    return os.getenv("GRAPHBOT_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "graphbot")
+
+
+def _model_catalog_path(api_key: str) -> str:
+    """
+    Location of the cached model catalog for an API key.
+
+    The file name embeds a hash of the key so rotating keys never reuses another
+    key's catalog.
+    """
+    digest = hashlib.blake2b(api_key.encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(_cache_dir(), f"models-{digest}.json")
+
+
+class QueryStore:
+    """
+    SQLite-backed store of generated Cypher that survives restarts.
+
+    Sits beneath the in-memory LRU; entries older than ttl are ignored and swept
+    on open. Any database error disables the store for the rest of the process,
+    leaving the in-memory cache as the only layer.
+    """
+
+    def __init__(self, path: str, ttl: float = QUERY_CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # Shared by the sync-wrapper loop thread and callers' loops; access is serialized by _lock
+            self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS q (k TEXT PRIMARY KEY, cypher TEXT NOT NULL, ts REAL NOT NULL)")
+            self._db.execute("DELETE FROM q WHERE ts < ?", (time.time() - ttl,))
+        except (OSError, sqlite3.Error) as e:
+            console.print(f"[yellow]Warning: Query cache disabled, could not open {path}: {e}[/yellow]")
+            self._disable()
+
+    @staticmethod
+    def _key(cache_key: tuple[Optional[str], ...]) -> str:
+        """Stable text key for a tuple such as (normalized request, schema context, model, prompt version)."""
+        raw = "\x00".join("" if part is None else part for part in cache_key).encode("utf-8")
+        return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+    def get(self, cache_key: tuple[Optional[str], ...]) -> Optional[str]:
+        """Return stored Cypher for cache_key, or None if absent, expired or unavailable."""
+        with self._lock:
+            if self._db is None:
+                return None
+            try:
+                row = self._db.execute(
+                    "SELECT cypher FROM q WHERE k = ? AND ts >= ?",
+                    (self._key(cache_key), time.time() - self.ttl),
+                ).fetchone()
+            except sqlite3.Error:
+                self._disable()
+                return None
+        return row[0] if row else None
+
+    def put(self, cache_key: tuple[Optional[str], ...], cypher: str):
+        """Store Cypher for cache_key, replacing any previous entry."""
+        with self._lock:
+            if self._db is None:
+                return
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO q (k, cypher, ts) VALUES (?, ?, ?)",
+                    (self._key(cache_key), cypher, time.time()),
+                )
+            except sqlite3.Error:
+                self._disable()
+
+    def _disable(self):
+        """Close the connection and stop using the store."""
+        if self._db is not None:
+            try:
+                self._db.close()
+            except sqlite3.Error:
+                pass
+        self._db = None
+
+    def close(self):
+        """Close the underlying database connection."""
+        with self._lock:
+            self._disable()
+
+
+def _normalize_query_text(text: str) -> str:
+    """
+    Canonicalize a natural language request for cache lookups.
+
+    Surrounding/repeated whitespace and trailing punctuation do not change the
+    Cypher a request should produce, so they are folded away. Case is kept:
+    quoted literals such as product codes or names can be case-sensitive.
+    """
+    return " ".join(text.split()).rstrip("?.! ")
 
 
 class GeminiService:
     """Handles Gemini API interactions for natural language processing."""
     
+    _env_loaded = False
+    
+    @classmethod
+    def _load_env(cls):
+        """Load .env / config.env once, on first construction rather than at import."""
+        if cls._env_loaded:
+            return
+        load_dotenv()  # Try .env first
+        config_file = os.getenv("CONFIG_FILE", "config/config.env")
+        if os.path.exists(config_file):
+            load_dotenv(config_file)  # Load config.env if it exists
+        cls._env_loaded = True
+    
     def __init__(self):
         """Initialize Gemini API client."""
+        self._load_env()
+        # GRAPHBOT_QUIET=1 silences per-request status lines (cache hits, generated queries);
+        # they still go to the debug logger. Warnings and errors are always printed.
+        self._quiet = os.getenv("GRAPHBOT_QUIET") == "1"
         api_key = os.getenv("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY environment variable is required")
@@ -44,6 +231,17 @@ class GeminiService:
             'gemini-2.0-flash-lite-preview-02-05', # Lite preview
         ]
         
+        # Fast models for the worker agent, in preference order
+        self.fast_model_names = [
+            'gemini-2.0-flash',
+            'gemini-2.0-flash-exp',
+            'gemini-2.0-flash-lite-preview-02-05',
+        ]
+        
+        # Position of each model in its preference list, for O(1) fallback lookups
+        self._model_priority = {name: i for i, name in enumerate(self.model_names)}
+        self._fast_model_priority = {name: i for i, name in enumerate(self.fast_model_names)}
+        
         self.main_model = None
         self.main_model_name = None
         
@@ -51,46 +249,147 @@ class GeminiService:
         self.worker_model_name = None
         
         self.available_models = {}  # Dictionary mapping short names to full model paths
+        self._catalog_loaded = False
+        self._model_not_found_count = 0
+        self._model_catalog_file = _model_catalog_path(api_key)
         
-        self._query_cache: Dict[str, str] = {}
+        # Ordered least- to most-recently used
+        self._query_cache: OrderedDict[tuple[str, Optional[str]], str] = OrderedDict()
         self._cache_size = 100
+        # Explanation templates from fused calls, keyed and bounded like _query_cache
+        self._explanation_templates: OrderedDict[tuple[str, Optional[str]], str] = OrderedDict()
+        # The LRUs and semantic entries are touched from caller loops and the sync-wrapper loop thread
+        self._cache_lock = threading.Lock()
+        # Opt-in paraphrase matching: (unit embedding, context, cypher), newest last
+        self._semantic_cache_enabled = os.getenv("GRAPHBOT_SEMANTIC_CACHE") == "1"
+        self._semantic_entries: deque[tuple[tuple[float, ...], Optional[str], str]] = deque(maxlen=self._cache_size)
+        # Opt-in persistent layer beneath the in-memory LRU; it writes prompts and Cypher to disk
+        self._query_store: Optional[QueryStore] = None
+        if os.getenv("GRAPHBOT_QUERY_STORE") == "1":
+            self._query_store = QueryStore(os.path.join(_cache_dir(), "queries.db"))
+        # Requests currently being generated, so concurrent duplicates share one API call
+        self._inflight: dict[tuple[str, Optional[str]], asyncio.Future] = {}
+        
+        # Background event loop shared by the synchronous wrappers (started lazily)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._loop_lock = threading.Lock()
+        
+        # One-shot warmup of the worker connection, triggered by the first Cypher request
+        self._worker_warmed = False
+        self._warmup_task: Optional[asyncio.Task] = None
         
         self._initialize_models()
 
     def _initialize_models(self):
         """Initialize both main and worker models."""
-        # Try to list available models first (optimization: do this once)
-        try:
-            # Add timeout to avoid hanging on startup if API is slow
-            # Note: genai.list_models() returns an iterator, we convert to list
-            # Depending on library version, list_models might not support timeout directly
-            all_models = list(genai.list_models())
-            
-            # Store both full names and short names
-            self.available_models = {}
-            for m in all_models:
-                if 'generateContent' in m.supported_generation_methods:
-                    short_name = m.name.split('/')[-1]
-                    self.available_models[short_name] = m.name  # Store full path
-            
-            available_short_names = list(self.available_models.keys())
-            console.print(f"[dim]Available models: {', '.join(available_short_names[:5])}...[/dim]")
-            
-            # Initialize Main Model (High Intelligence)
-            self._init_main_model()
-            
-            # Initialize Worker Model (High Speed/Efficiency)
-            self._init_worker_model()
-            
-        except Exception as e:
-            # Fallback initialization if list_models fails or times out
-            console.print(f"[bold bright_red]⚠️  Could not list models, trying defaults: {str(e)[:50]}...[/bold bright_red]")
+        # GenerativeModel construction is local, so pinned models need no catalog;
+        # it is loaded lazily if a fallback is ever needed
+        if os.getenv("MAIN_MODEL") and os.getenv("WORKER_MODEL"):
             self._init_main_model(fallback=True)
             self._init_worker_model(fallback=True)
+        else:
+            try:
+                self._load_available_models()
+                
+                available_short_names = list(self.available_models.keys())
+                console.print(f"[dim]Available models: {', '.join(available_short_names[:5])}...[/dim]")
+                
+                # Initialize Main Model (High Intelligence)
+                self._init_main_model()
+                
+                # Initialize Worker Model (High Speed/Efficiency)
+                self._init_worker_model()
+                
+            except Exception as e:
+                # Fallback initialization if list_models fails or times out
+                console.print(f"[bold bright_red]⚠️  Could not list models, trying defaults: {str(e)[:50]}...[/bold bright_red]")
+                self._init_main_model(fallback=True)
+                self._init_worker_model(fallback=True)
             
         if not self.main_model:
             raise ValueError("Failed to initialize Gemini API. No suitable models found.")
 
+    def _load_available_models(self):
+        """Fill available_models from the on-disk catalog, or from list_models when it is stale."""
+        self._catalog_loaded = True
+        # A recent on-disk catalog saves the list_models round-trip
+        catalog = self._load_model_catalog()
+        if catalog is None:
+            # Filter while iterating; map short names to full model paths
+            catalog = {
+                m.name.rsplit('/', 1)[-1]: m.name
+                for m in genai.list_models()
+                if 'generateContent' in m.supported_generation_methods
+            }
+            self._save_model_catalog(catalog)
+        for short_name, full_name in catalog.items():
+            self.available_models.setdefault(short_name, full_name)
+
+    def _ensure_available_models(self) -> bool:
+        """Load the model catalog on first use; returns False if no models are known."""
+        if not self._catalog_loaded:
+            try:
+                self._load_available_models()
+            except Exception:
+                # Not retried: a failing list_models should not be re-run on every rate-limit error
+                pass
+        return bool(self.available_models)
+
+    async def _ensure_available_models_async(self) -> bool:
+        """Like _ensure_available_models, but list_models and the catalog file I/O run in a worker thread."""
+        if not self._catalog_loaded:
+            await asyncio.to_thread(self._ensure_available_models)
+        return bool(self.available_models)
+
+    def _load_model_catalog(self) -> Optional[dict[str, str]]:
+        """Return the cached model catalog, or None if it is missing, stale or unreadable."""
+        try:
+            if time.time() - os.path.getmtime(self._model_catalog_file) > MODEL_CATALOG_TTL:
+                return None
+            with open(self._model_catalog_file, 'rb') as f:
+                catalog = json.loads(f.read())
+        except (OSError, ValueError):
+            return None
+        return catalog if isinstance(catalog, dict) and catalog else None
+
+    def _save_model_catalog(self, catalog: dict[str, str]):
+        """Persist the model catalog atomically; failures only cost a future list_models call."""
+        if not catalog:
+            return
+        temp_file = self._model_catalog_file + '.tmp'
+        try:
+            os.makedirs(os.path.dirname(self._model_catalog_file), exist_ok=True)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(catalog, f)
+            os.replace(temp_file, self._model_catalog_file)
+        except OSError:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+
+    def invalidate_model_catalog(self):
+        """Forget the cached model catalog so the next lookup calls list_models again."""
+        try:
+            os.remove(self._model_catalog_file)
+        except OSError:
+            pass
+        self.available_models = {}
+        self._catalog_loaded = False
+
+    def _refresh_model_catalog(self):
+        """Drop the cached model catalog and load a fresh one; blocks on list_models."""
+        self.invalidate_model_catalog()
+        self._ensure_available_models()
+
+    async def _note_model_not_found(self):
+        """Count a "model not found" error; repeated ones mean the catalog has gone stale."""
+        self._model_not_found_count += 1
+        if self._model_not_found_count >= MODEL_NOT_FOUND_REFRESH_AFTER:
+            self._model_not_found_count = 0
+            logger.debug("Repeated model-not-found errors; refreshing the model catalog")
+            # File removal and list_models block, so refresh in a worker thread
+            await asyncio.to_thread(self._refresh_model_catalog)
+
     def _init_main_model(self, fallback=False):
         """Initialize the main 'brain' model."""
         target_model = os.getenv("MAIN_MODEL", "gemini-3-pro-preview")
@@ -113,8 +412,7 @@ class GeminiService:
             return
 
         # Fallback to flash/fast models
-        fast_models = ['gemini-2.0-flash', 'gemini-2.0-flash-exp', 'gemini-2.0-flash-lite-preview-02-05']
-        for model_name in fast_models:
+        for model_name in self.fast_model_names:
             if self._set_model(model_name, is_main=False, fallback=fallback):
                 return
                 
@@ -144,6 +442,42 @@ class GeminiService:
         except Exception:
             return False
 
+    def _run_sync(self, coro):
+        """Run a coroutine on the background event loop and block until it finishes."""
+        with self._loop_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name="gemini-sync-loop", daemon=True
+                )
+                self._loop_thread.start()
+            loop = self._loop
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def close(self):
+        """Stop the background event loop used by the synchronous wrappers and close the query store."""
+        if self._query_store is not None:
+            self._query_store.close()
+        with self._loop_lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+        if loop is None:
+            return
+        # Cancel leftovers such as the worker warmup so they do not die with the loop
+        asyncio.run_coroutine_threadsafe(self._cancel_pending_tasks(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    @staticmethod
+    async def _cancel_pending_tasks():
+        """Cancel every other task on the running loop and wait for them to finish."""
+        current = asyncio.current_task()
+        tasks = [task for task in asyncio.all_tasks() if task is not current]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
     def set_main_model(self, model_name: str) -> bool:
         """Dynamically switch the main model."""
         return self._set_model(model_name, is_main=True, fallback=True)
@@ -159,16 +493,32 @@ class GeminiService:
             return ""
         text_parts = []
         for part in parts:
-            if hasattr(part, 'text'):
-                text_parts.append(str(part.text))
-            elif isinstance(part, str):
+            if isinstance(part, str):
                 text_parts.append(part)
-            elif hasattr(part, 'get'):
-                text = part.get('text', '')
-                if text:
-                    text_parts.append(str(text))
+                continue
+            # EAFP: response parts almost always carry .text
+            try:
+                text = part.text
+            except AttributeError:
+                text = part.get('text', '') if hasattr(part, 'get') else ''
+                if not text:
+                    continue
+            text_parts.append(text if text.__class__ is str else str(text))
+        if len(text_parts) == 1:
+            return text_parts[0]
         return ''.join(text_parts)
 
+    @staticmethod
+    def _iter_response_parts(response):
+        """Yield candidate part lists in lookup order: result.parts, parts, candidates[0].content.parts."""
+        result = getattr(response, 'result', None)
+        if result is not None:
+            yield getattr(result, 'parts', None)
+        yield getattr(response, 'parts', None)
+        candidates = getattr(response, 'candidates', None)
+        if candidates:
+            yield getattr(getattr(candidates[0], 'content', None), 'parts', None)
+
     def _extract_text(self, response) -> str:
         """
         Safely extract text from Gemini API response.
@@ -179,34 +529,21 @@ class GeminiService:
         Returns:
             Extracted text string
         """
-        # Try response.text first (simplest and most common)
+        # Try response.text first (simplest and most common); it is already a str
         try:
-            return str(response.text)
+            text = response.text
         except (ValueError, AttributeError):
             pass
+        else:
+            if text is None:
+                return ""
+            return text if text.__class__ is str else str(text)
         
-        # Try response.result.parts
-        if hasattr(response, 'result') and hasattr(response.result, 'parts'):
-            text = self._extract_text_from_parts(response.result.parts)
+        for parts in self._iter_response_parts(response):
+            text = self._extract_text_from_parts(parts)
             if text:
                 return text
         
-        # Try response.parts directly
-        if hasattr(response, 'parts'):
-            text = self._extract_text_from_parts(response.parts)
-            if text:
-                return text
-        
-        # Try response.candidates[0].content.parts (full path)
-        if hasattr(response, 'candidates') and response.candidates:
-            try:
-                parts = response.candidates[0].content.parts
-                text = self._extract_text_from_parts(parts)
-                if text:
-                    return text
-            except (AttributeError, IndexError):
-                pass
-        
         # Build debug info for error message
         error_info = []
         if hasattr(response, 'candidates'):
@@ -218,7 +555,7 @@ class GeminiService:
     
     def generate_cypher_query(self, user_input: str, context: Optional[str] = None) -> str:
         """Synchronous wrapper for backward compatibility."""
-        return asyncio.run(self.generate_cypher_query_async(user_input, context))
+        return self._run_sync(self.generate_cypher_query_async(user_input, context))
 
     async def generate_cypher_query_async(self, user_input: str, context: Optional[str] = None) -> str:
         """
@@ -231,60 +568,181 @@ class GeminiService:
         Returns:
             Cypher query string
         """
-        # 1. Check Cache
-        cache_key = hashlib.md5(f"{user_input}:{context}".encode()).hexdigest()
-        if cache_key in self._query_cache:
-            console.print("[dim]⚡ Using cached query...[/dim]")
-            return self._query_cache[cache_key]
-
-        # Build context-aware prompt
-        base_prompt = """You are an expert Neo4j Cypher Query Developer.
-Your task is to accurately translate the user's natural language request into an executable Cypher query.
+        # 1. Check Cache (keyed on the normalized request so trivial rephrasings hit)
+        cache_key = (_normalize_query_text(user_input), context)
+        cached = self._lru_get(self._query_cache, cache_key)
+        if cached is not None:
+            logger.debug("Using cached query for %r", user_input)
+            if not self._quiet:
+                console.print("[dim]⚡ Using cached query...[/dim]")
+            return cached
+        
+        stored = await self._load_stored_query(cache_key)
+        if stored is not None:
+            self._remember_query(cache_key, stored)
+            logger.debug("Using stored query for %r", user_input)
+            if not self._quiet:
+                console.print("[dim]⚡ Using stored query...[/dim]")
+            return stored
 
-### STRICT OUTPUT RULES:
-1. **Raw Text Only**: Output ONLY the Cypher code. Do NOT use markdown blocks (```cypher). Do NOT provide explanations or apologies.
-2. **Syntax**: Use valid Neo4j Cypher syntax.
+        # 2. Join an identical request already in flight on this loop
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None and inflight.get_loop() is loop:
+            logger.debug("Joining in-flight query for %r", user_input)
+            if not self._quiet:
+                console.print("[dim]⚡ Waiting for identical in-flight query...[/dim]")
+            # Shield so a cancelled follower does not cancel the shared request
+            return await asyncio.shield(inflight)
 
-### QUERY GUIDELINES:
-1. **Fuzzy Matching**: When searching for names or text, use case-insensitive contains (e.g., `WHERE toLower(n.name) CONTAINS toLower('search_term')`) unless searching by exact ID.
-2. **Boolean/Flags**: For flag-like properties (e.g., isFraud, hasError), check multiple formats if schema is ambiguous: `WHERE n.prop = true OR toLower(toString(n.prop)) IN ['yes', '1', 'true']`.
-3. **Safety**: For DELETE operations, ensure you use `DETACH DELETE` if nodes might have relationships.
-4. **Readability**: Always Return relevant, readable properties (e.g., names, IDs, counts) rather than just nodes (`RETURN n`).
-5. **Limits**: For broad queries (e.g., "Show me all nodes"), ALWAYS append `LIMIT 25` to prevent database overloads.
-6. **Logic**:
-   - "How many" -> Use `RETURN count(...)`
-   - "Find connections" -> Use `MATCH p=(a)-[*]->(b) ... RETURN p`
+        future = loop.create_future()
+        # Mark any exception as retrieved even when no follower awaited it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[cache_key] = future
+        try:
+            query = await self._generate_cypher_query_uncached(user_input, context, cache_key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(query)
+            return query
+        finally:
+            if self._inflight.get(cache_key) is future:
+                del self._inflight[cache_key]
 
-"""
-        if context:
-            base_prompt += f"\n### DATABASE SCHEMA:\n{context}\n"
+    async def stream_cypher_query_async(self, user_input: str, context: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        Generate a Cypher query, yielding text as the model produces it.
         
-        prompt = base_prompt + f"\nUser request: {user_input}\n\nCypher query:"
+        Chunks are raw model output (they may include code fences) for live display; once the
+        stream ends the cleaned query is cached, so generate_cypher_query_async returns it
+        without another call.
+        
+        Args:
+            user_input: Natural language query from user
+            context: Optional context about the database schema
+            
+        Yields:
+            Pieces of the query text, or the whole query in one piece when it is already cached
+        """
+        cache_key = (_normalize_query_text(user_input), context)
+        if (
+            cache_key in self._query_cache
+            or cache_key in self._inflight
+            or await self._load_stored_query(cache_key) is not None
+        ):
+            # Nothing to stream: the cached or in-flight query arrives in one piece
+            yield await self.generate_cypher_query_async(user_input, context)
+            return
+        
+        pieces = []
+        try:
+            response = await self.main_model.generate_content_async(
+                self._build_cypher_prompt(user_input, context), stream=True
+            )
+            async for chunk in response:
+                try:
+                    text = self._extract_text(chunk)
+                except ValueError:
+                    # Chunks carrying only metadata (e.g. the finish reason) have no text
+                    continue
+                if text:
+                    pieces.append(text)
+                    yield text
+        except Exception:
+            if pieces:
+                raise
+            # Nothing shown yet: use the non-streaming path with its retries and model fallback
+            yield await self.generate_cypher_query_async(user_input, context)
+            return
         
-        # Try with retry logic and model fallback
+        query = self._clean_query_response("".join(pieces).strip())
+        if not query:
+            # A stream of metadata-only chunks produced no query; never cache an empty one
+            yield await self.generate_cypher_query_async(user_input, context)
+            return
+        await self._store_generated_query(cache_key, query)
+
+    async def _generate_cypher_query_uncached(
+        self, user_input: str, context: Optional[str], cache_key: tuple[str, Optional[str]]
+    ) -> str:
+        """Call the main model with retries and fallback, then cache the result under cache_key."""
+        # Warm the worker while the main brain works, so the first explanation skips the handshake
+        if not self._worker_warmed:
+            self._worker_warmed = True
+            if self.worker_model is not None and self.worker_model is not self.main_model:
+                self._warmup_task = asyncio.create_task(self._warm_worker())
+
+        # A paraphrase of an earlier request under the same schema reuses its Cypher
+        embedding = None
+        if self._semantic_cache_enabled:
+            embedding = await self._embed(user_input)
+            similar = self._find_similar_query(embedding, context) if embedding else None
+            if similar is not None:
+                logger.debug("Using semantically similar query for %r", user_input)
+                if not self._quiet:
+                    console.print("[dim]⚡ Using cached query for a similar request...[/dim]")
+                self._remember_query(cache_key, similar)
+                return similar
+
+        query = self._clean_query_response(
+            await self._generate_with_main_model(self._build_cypher_prompt(user_input, context))
+        )
+        await self._store_generated_query(cache_key, query)
+        if embedding:
+            with self._cache_lock:
+                self._semantic_entries.append((embedding, context, query))
+        return query
+
+    @staticmethod
+    def _build_cypher_prompt(user_input: str, context: Optional[str]) -> str:
+        """Build the context-aware Cypher prompt: one f-string over a precomputed prefix."""
+        if context:
+            return f"{_CYPHER_PROMPT_SCHEMA_PREFIX}{context}\n\nUser request: {user_input}\n\nCypher query:"
+        return f"{_CYPHER_PROMPT_REQUEST_PREFIX}{user_input}\n\nCypher query:"
+
+    async def _store_generated_query(self, cache_key: tuple[str, Optional[str]], query: str):
+        """Report a freshly generated query and record it in the LRU and the persistent store."""
+        logger.debug("Generated query: %s", query)
+        if not self._quiet:
+            console.print(f"[bold bright_blue]🔍 Generated query:[/bold bright_blue] [dim]{query}[/dim]")
+        self._remember_query(cache_key, query)
+        if self._query_store is not None:
+            # SQLite calls block, so keep them off the event loop
+            await asyncio.to_thread(self._query_store.put, self._store_key(cache_key), query)
+
+    async def _load_stored_query(self, cache_key: tuple[str, Optional[str]]) -> Optional[str]:
+        """Look up cache_key in the persistent store, if it is enabled, without blocking the loop."""
+        if self._query_store is None:
+            return None
+        return await asyncio.to_thread(self._query_store.get, self._store_key(cache_key))
+
+    def _store_key(self, cache_key: tuple[str, Optional[str]]) -> tuple[Optional[str], ...]:
+        """Persistent key: stored Cypher is only reused for the same model and prompt version."""
+        return (*cache_key, self.main_model_name, CYPHER_PROMPT_VERSION)
+
+    async def _generate_with_main_model(self, prompt: str) -> str:
+        """Send a prompt to the main model with retry logic and model fallback; returns the stripped text."""
         max_retries = 3
         retry_delay = 1
         
         for attempt in range(max_retries):
             try:
                 response = await self.main_model.generate_content_async(prompt)
-                query = self._clean_query_response(self._extract_text(response).strip())
-                
-                console.print(f"[bold bright_blue]🔍 Generated query:[/bold bright_blue] [dim]{query}[/dim]")
-                
-                # Update Cache (LRU eviction)
-                if len(self._query_cache) >= self._cache_size:
-                    self._query_cache.pop(next(iter(self._query_cache)))
-                self._query_cache[cache_key] = query
-                
-                return query
+                self._model_not_found_count = 0
+                return self._extract_text(response).strip()
                 
             except Exception as e:
                 error_str = str(e)
+                error_lower = error_str.lower()
                 is_last_attempt = attempt == max_retries - 1
                 
                 # API Key errors - fail immediately
-                if self._is_api_key_error(error_str):
+                if self._is_api_key_error(error_str, error_lower):
                     console.print("[bold bright_red]❌ Invalid API Key[/bold bright_red]")
                     console.print("[bright_red]   Error: API Key not found or invalid[/bright_red]")
                     console.print("[bold bright_yellow]💡 Tips:[/bold bright_yellow]")
@@ -293,17 +751,18 @@ Your task is to accurately translate the user's natural language request into an
                     raise Exception("Invalid API Key. Please check your GEMINI_API_KEY in the .env file.")
                 
                 # Model not found - try fallback
-                if self._is_model_not_found_error(error_str):
-                    if not is_last_attempt and self._try_fallback_model():
+                if self._is_model_not_found_error(error_str, error_lower):
+                    await self._note_model_not_found()
+                    if not is_last_attempt and await self._try_fallback_model_async():
                         console.print(f"[bold bright_blue]🔄 Model not found, switched to: {self.main_model_name}[/bold bright_blue]")
                         continue
                     console.print(f"[bold bright_red]❌ Model {self.main_model_name} not found[/bold bright_red]")
                     raise Exception(f"Model not found: {error_str[:200]}")
                 
                 # Rate limit - try fallback or wait
-                if self._is_rate_limit_error(error_str):
+                if self._is_rate_limit_error(error_str, error_lower):
                     if not is_last_attempt:
-                        if self._try_fallback_model():
+                        if await self._try_fallback_model_async():
                             console.print(f"[bold bright_blue]🔄 Switched to model: {self.main_model_name}[/bold bright_blue]")
                             continue
                         wait_time = self._extract_retry_time(error_str) or retry_delay * (attempt + 1)
@@ -324,62 +783,237 @@ Your task is to accurately translate the user's natural language request into an
         
         raise Exception("Failed to generate query after multiple attempts")
     
+    def _remember_query(self, cache_key: tuple[str, Optional[str]], query: str):
+        """Insert a query into the in-memory LRU, evicting the least recently used entry."""
+        self._lru_put(self._query_cache, cache_key, query)
+
+    def _lru_get(self, cache: OrderedDict, key: tuple[str, Optional[str]]) -> Optional[str]:
+        """Look up key in one of the LRUs, marking it most recently used on a hit."""
+        with self._cache_lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _lru_put(self, cache: OrderedDict, key: tuple[str, Optional[str]], value: str):
+        """Insert key into one of the LRUs, evicting the least recently used entry."""
+        with self._cache_lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            if len(cache) > self._cache_size:
+                cache.popitem(last=False)
+
+    async def _embed(self, text: str) -> Optional[tuple[float, ...]]:
+        """Embed text as a unit vector, or return None if the embedding call fails."""
+        try:
+            result = await genai.embed_content_async(
+                model=EMBEDDING_MODEL, content=text, task_type="semantic_similarity"
+            )
+            vector = result["embedding"]
+        except Exception as e:
+            logger.debug("Embedding failed, skipping semantic cache: %s", e)
+            return None
+        norm = math.sqrt(sum(x * x for x in vector))
+        if not norm:
+            return None
+        return tuple(x / norm for x in vector)
+
+    def _find_similar_query(self, embedding: tuple[float, ...], context: Optional[str]) -> Optional[str]:
+        """Return the cached Cypher whose request is most similar to embedding, if similar enough."""
+        # Score a snapshot: another thread may append while the scores are computed
+        with self._cache_lock:
+            entries = list(self._semantic_entries)
+        best_score = SEMANTIC_CACHE_THRESHOLD
+        best_query = None
+        for cached_embedding, cached_context, query in entries:
+            if cached_context != context:
+                continue
+            # Unit vectors: the dot product is the cosine similarity
+            score = math.fsum(map(float.__mul__, embedding, cached_embedding))
+            if score >= best_score:
+                best_score, best_query = score, query
+        return best_query
+
+    async def _warm_worker(self):
+        """Send a one-token request to open the worker model's connection ahead of use."""
+        try:
+            await self.worker_model.generate_content_async("ok", generation_config={"max_output_tokens": 1})
+        except Exception:
+            # Warmup is best effort; the real request will surface any problem
+            pass
+
+    def _fallback_candidates(self) -> list[str]:
+        """Available main models ranked after the current one, in preference order; the catalog must be loaded."""
+        start = self._model_priority.get(self.main_model_name, -1) + 1
+        return [
+            model_name for model_name in self.model_names[start:]
+            if model_name != self.main_model_name and model_name in self.available_models
+        ]
+
     def _try_fallback_model(self) -> bool:
         """Try to switch to a different model if current one has quota issues."""
-        if not self.available_models:
+        if not self._ensure_available_models():
             return False
         
-        current_index = self.model_names.index(self.main_model_name) if self.main_model_name in self.model_names else -1
+        # Try the models ranked after the current one, in order
+        for model_name in self._fallback_candidates():
+            if self.set_main_model(model_name):
+                return True
         
-        # Try next available model in the list
-        for i, model_name in enumerate(self.model_names):
-            if i > current_index and model_name in self.available_models:
-                try:
-                    self.set_main_model(model_name)
+        return False
+
+    async def _try_fallback_model_async(self) -> bool:
+        """
+        Probe the fallback models concurrently and switch to the first one that answers.
+        
+        During a rate-limit storm a sequential switch can land on another exhausted model and
+        burn a whole retry; one-token probes find a live model in a single round trip.
+        """
+        # list_models blocks, so a first-time catalog load must not run on the event loop
+        if not await self._ensure_available_models_async():
+            return False
+        candidates = self._fallback_candidates()
+        if not candidates:
+            return False
+        
+        probes = [asyncio.create_task(self._probe_model(model_name)) for model_name in candidates]
+        try:
+            for probe in asyncio.as_completed(probes):
+                model_name = await probe
+                if model_name is not None and self.set_main_model(model_name):
+                    return True
+            return False
+        finally:
+            for probe in probes:
+                probe.cancel()
+            await asyncio.gather(*probes, return_exceptions=True)
+
+    async def _probe_model(self, model_name: str) -> Optional[str]:
+        """Send a one-token request to a model; returns its name if it answered, else None."""
+        try:
+            model = genai.GenerativeModel(self.available_models[model_name])
+            await model.generate_content_async("ok", generation_config={"max_output_tokens": 1})
+        except Exception:
+            return None
+        return model_name
+
+    def _try_fallback_worker_model(self) -> bool:
+        """Switch the worker to the next available fast model, leaving the main brain untouched."""
+        if not self._ensure_available_models():
+            return False
+        
+        start = self._fast_model_priority.get(self.worker_model_name, -1) + 1
+        for model_name in self.fast_model_names[start:]:
+            if model_name != self.worker_model_name and model_name in self.available_models:
+                if self._set_model(model_name, is_main=False, fallback=False):
                     return True
-                except Exception:
-                    continue
         
         return False
 
-    def _is_api_key_error(self, error_str: str) -> bool:
+    # The _is_*_error helpers test the HTTP status code first so most checks short-circuit;
+    # callers classifying one error several times should pass error_lower to lowercase it once.
+
+    def _is_api_key_error(self, error_str: str, error_lower: Optional[str] = None) -> bool:
         """Check if error is related to invalid API key."""
-        return "400" in error_str and (
-            "API Key" in error_str or 
-            "API_KEY_INVALID" in error_str or 
-            "api key" in error_str.lower()
-        )
+        if "400" not in error_str:
+            return False
+        if "API_KEY_INVALID" in error_str:
+            return True
+        return "api key" in (error_lower if error_lower is not None else error_str.lower())
 
-    def _is_model_not_found_error(self, error_str: str) -> bool:
+    def _is_model_not_found_error(self, error_str: str, error_lower: Optional[str] = None) -> bool:
         """Check if error is related to model not found."""
-        return "404" in error_str or "not found" in error_str.lower()
+        if "404" in error_str:
+            return True
+        return "not found" in (error_lower if error_lower is not None else error_str.lower())
 
-    def _is_rate_limit_error(self, error_str: str) -> bool:
+    def _is_rate_limit_error(self, error_str: str, error_lower: Optional[str] = None) -> bool:
         """Check if error is related to rate limiting."""
-        return "429" in error_str or "quota" in error_str.lower() or "rate limit" in error_str.lower()
+        if "429" in error_str:
+            return True
+        if error_lower is None:
+            error_lower = error_str.lower()
+        return "quota" in error_lower or "rate limit" in error_lower
 
     def _extract_retry_time(self, error_str: str) -> Optional[float]:
         """Extract retry time from rate limit error message."""
-        if "retry in" in error_str.lower():
-            match = re.search(r'retry in ([\d.]+)s', error_str.lower())
-            if match:
-                try:
-                    return float(match.group(1))
-                except ValueError:
-                    pass
+        match = _RETRY_RE.search(error_str)
+        if match:
+            try:
+                return float(match.group(1))
+            except ValueError:
+                pass
         return None
 
     def _clean_query_response(self, query: str) -> str:
         """Remove markdown code blocks from query response."""
         if query.startswith("```"):
-            lines = query.split("\n")
-            query = "\n".join(lines[1:-1]) if len(lines) > 2 else query
-            query = query.replace("```cypher", "").replace("```", "").strip()
+            query = _FENCE_RE.sub("", query).strip()
         return query
     
+    async def generate_cypher_and_explanation_async(
+        self, user_input: str, context: Optional[str] = None
+    ) -> tuple[str, Optional[str]]:
+        """
+        Generate a Cypher query and an explanation of its results in one model call.
+        
+        The explanation is written before the query runs, with EXPLANATION_COUNT_PLACEHOLDER
+        where the result count belongs; fill it in with fill_explanation once results arrive.
+        
+        Args:
+            user_input: Natural language query from user
+            context: Optional context about the database schema
+            
+        Returns:
+            Tuple of (Cypher query, explanation template or None if the model ignored the format)
+        """
+        cache_key = (_normalize_query_text(user_input), context)
+        with self._cache_lock:
+            cached = self._query_cache.get(cache_key)
+            template = self._explanation_templates.get(cache_key)
+            if cached is not None and template is not None:
+                self._query_cache.move_to_end(cache_key)
+                self._explanation_templates.move_to_end(cache_key)
+                return cached, template
+
+        text = await self._generate_with_main_model(
+            self._build_cypher_prompt(user_input, context) + _FUSED_PROMPT_SUFFIX
+        )
+        query, template = self._parse_fused_response(text)
+        if not query or _FUSED_LABEL_RE.search(query):
+            # Section labels left in the "query" mean the format was mangled; never run or cache
+            # that text. Regenerate with the plain prompt; callers explain the result separately.
+            return await self.generate_cypher_query_async(user_input, context), None
+        
+        await self._store_generated_query(cache_key, query)
+        if template is not None:
+            self._lru_put(self._explanation_templates, cache_key, template)
+        return query, template
+
+    def _parse_fused_response(self, text: str) -> tuple[str, Optional[str]]:
+        """
+        Split a fused reply into (query, explanation template or None).
+
+        Tolerates a missing "---" separator and a code fence around the whole reply; without an
+        EXPLANATION section the whole reply (minus any CYPHER: label) is taken as the query.
+        """
+        text = self._clean_query_response(text.strip())
+        match = _FUSED_EXPLANATION_RE.search(text)
+        if match is None:
+            query_part, template = text, None
+        else:
+            query_part, template = text[:match.start()], text[match.end():].strip() or None
+        query_part = _FUSED_SEPARATOR_RE.sub("", _FUSED_CYPHER_LABEL_RE.sub("", query_part.strip(), count=1))
+        return self._clean_query_response(query_part.strip()), template
+
+    @staticmethod
+    def fill_explanation(template: str, results: list) -> str:
+        """Substitute the result count into an explanation template from a fused call."""
+        return template.replace(EXPLANATION_COUNT_PLACEHOLDER, str(len(results)))
+    
     def explain_result(self, query: str, results: list, user_input: str) -> str:
         """Synchronous wrapper for backward compatibility."""
-        return asyncio.run(self.explain_result_async(query, results, user_input))
+        return self._run_sync(self.explain_result_async(query, results, user_input))
 
     async def explain_result_async(self, query: str, results: list, user_input: str) -> str:
         """
@@ -401,9 +1035,89 @@ Number of results: {len(results)}
 
 Provide a brief, user-friendly explanation of what was found or what operation was performed."""
         
-        try:
-            response = await self.main_model.generate_content_async(prompt)
-            return self._extract_text(response).strip()
-        except Exception as e:
-            console.print(f"[bold bright_red]⚠️  Could not generate explanation: {str(e)}[/bold bright_red]")
-            return "Query executed successfully."
+        # Summarizing a small result set is worker work; keep the main brain's quota for Cypher
+        for attempt in range(2):
+            model = self.worker_model or self.main_model
+            try:
+                response = await model.generate_content_async(prompt)
+                return self._extract_text(response).strip()
+            except Exception as e:
+                error_str = str(e)
+                error_lower = error_str.lower()
+                if (
+                    attempt == 0
+                    and (self._is_rate_limit_error(error_str, error_lower)
+                         or self._is_model_not_found_error(error_str, error_lower))
+                    and await self._ensure_available_models_async()
+                    and self._try_fallback_worker_model()
+                ):
+                    console.print(f"[bold bright_blue]🔄 Worker switched to model: {self.worker_model_name}[/bold bright_blue]")
+                    continue
+                console.print(f"[bold bright_red]⚠️  Could not generate explanation: {error_str}[/bold bright_red]")
+                return "Query executed successfully."
+        return "Query executed successfully."
+
+    def explain_results_batch(self, items: list[tuple[str, list, str]]) -> list[str]:
+        """Synchronous wrapper for explain_results_batch_async."""
+        return self._run_sync(self.explain_results_batch_async(items))
+
+    async def explain_results_batch_async(
+        self,
+        items: list[tuple[str, list, str]],
+        max_concurrency: int = EXPLAIN_BATCH_CONCURRENCY,
+    ) -> list[str]:
+        """
+        Explain many query results concurrently for non-interactive workloads.
+        
+        Args:
+            items: (query, results, user_input) tuples, as passed to explain_result_async
+            max_concurrency: Maximum number of explanation requests in flight at once
+            
+        Returns:
+            Explanations in the same order as items
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def explain(query: str, results: list, user_input: str) -> str:
+            async with semaphore:
+                return await self.explain_result_async(query, results, user_input)
+
+        return list(await asyncio.gather(*(explain(*item) for item in items)))
+
+    async def query_and_explain(
+        self,
+        user_input: str,
+        context: Optional[str],
+        executor: Callable[[str], Awaitable[list[dict[str, Any]]]],
+        fused: bool = False,
+    ) -> tuple[str, list[dict[str, Any]], "asyncio.Task[str]"]:
+        """
+        Generate a Cypher query, execute it, and start explaining the results in the background.
+        
+        The explanation request is launched as soon as the results are available, so the
+        caller can render them while the explanation is still being generated.
+        
+        Args:
+            user_input: Natural language query from user
+            context: Optional context about the database schema
+            executor: Coroutine function that runs a Cypher query and returns its records
+            fused: Ask for the explanation in the same call as the query, saving a round trip;
+                falls back to a separate explanation call if the model ignores the format
+            
+        Returns:
+            Tuple of (cypher query, results, task resolving to the explanation)
+        """
+        if fused:
+            cypher, template = await self.generate_cypher_and_explanation_async(user_input, context)
+        else:
+            cypher, template = await self.generate_cypher_query_async(user_input, context), None
+        results = await executor(cypher)
+        if template is not None:
+            explain_task = asyncio.create_task(self._filled_explanation(template, results))
+        else:
+            explain_task = asyncio.create_task(self.explain_result_async(cypher, results, user_input))
+        return cypher, results, explain_task
+
+    async def _filled_explanation(self, template: str, results: list) -> str:
+        """Task body for a fused explanation, so query_and_explain always hands back a task."""
+        return self.fill_explanation(template, results)
@@ -1,6 +1,9 @@
 """Insight Agent for automatic database mapping and analysis."""
-from typing import Any, Dict, List, TYPE_CHECKING
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 import asyncio
+import hashlib
+import random
+import re
 from rich.console import Console
 from graphbot.handlers import Neo4jHandler
 from graphbot.services.cache_manager import get_cache_manager, create_cache_key
@@ -13,6 +16,70 @@ console = Console()
 # Constants for retry logic
 MAX_LLM_RETRIES = 2
 LLM_RETRY_DELAY = 1.0
+LLM_RETRY_MAX_DELAY = 30.0
+# Error messages worth retrying; 429 is the provider throttling us
+_RETRYABLE_RE = re.compile(r"timeout|cancelled|429|50[0234]", re.IGNORECASE)
+# Worker model calls in flight at once per agent, so retries cannot pile up on a throttled endpoint
+MAX_CONCURRENT_LLM_CALLS = 4
+
+# Schema count subqueries run IN CONCURRENT TRANSACTIONS on servers that support it (5.21+)
+CONCURRENT_CALL_MIN_VERSION = (5, 21)
+CONCURRENT_CALL_BATCH_ROWS = 16
+
+# Share of label and relationship type names two schemas must have in common (Jaccard)
+# for insights written for one to be reused for the other
+SCHEMA_REUSE_THRESHOLD = 0.95
+
+
+_SUMMARY_PROMPT_TEMPLATE = """You are a Database Analyst. Analyze the following Neo4j schema and provide a concise, high-level summary of what this database represents.
+
+Identify:
+1. The main domain (e.g., "Healthcare", "Movies", "Finance").
+2. The core entities and how they relate.
+3. Any interesting data volume stats.
+
+Schema:
+{schema}
+
+Output a short paragraph (max 3 sentences)."""
+
+# Used when the summary is written from label and type names alone, before counts exist
+_NAMES_SUMMARY_PROMPT_TEMPLATE = """You are a Database Analyst. Analyze the following Neo4j schema and provide a concise, high-level summary of what this database represents. The schema lists label and relationship type names only, without counts.
+
+Identify:
+1. The main domain (e.g., "Healthcare", "Movies", "Finance").
+2. The core entities and how they relate.
+
+Schema:
+{schema}
+
+Do not guess at data volumes. Output a short paragraph (max 3 sentences)."""
+
+_QUESTIONS_PROMPT_TEMPLATE = """Based on this database schema, suggest 3 interesting natural language questions a user might want to ask.
+
+{summary_block}Schema:
+{schema}
+
+Output ONLY a list of 3 questions, one per line. No numbering or bullets."""
+
+
+def _schema_fingerprint(labels: list[str], types: list[str]) -> str:
+    """Short hash of the label and relationship type names, used to spot schema changes."""
+    joined = "\x1f".join(labels) + "\x1e" + "\x1f".join(types)
+    return hashlib.blake2b(joined.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _retry_delay(attempt: int) -> float:
+    """Exponential backoff with full jitter, so parallel calls that failed together retry apart."""
+    return min(LLM_RETRY_MAX_DELAY, LLM_RETRY_DELAY * (2 ** attempt) * random.random())
+
+
+def _schema_similarity(a: tuple[list[str], list[str]], b: tuple[list[str], list[str]]) -> float:
+    """Jaccard similarity of two schemas' label and relationship type names."""
+    a_names = {("label", n) for n in a[0]} | {("type", n) for n in a[1]}
+    b_names = {("label", n) for n in b[0]} | {("type", n) for n in b[1]}
+    union = a_names | b_names
+    return len(a_names & b_names) / len(union) if union else 1.0
 
 
 class InsightAgent:
@@ -25,6 +92,13 @@ class InsightAgent:
         """Initialize with LLM service to access worker model."""
         self.llm_service = llm_service
         self.worker_model = self.llm_service.get_worker_model()
+        # Server URI -> whether it runs CALL {} IN CONCURRENT TRANSACTIONS
+        self._concurrent_call_support: dict[str, bool] = {}
+        # Server URIs known to lack APOC, so apoc.meta.stats is not retried there
+        self._apoc_missing: set[str] = set()
+        self._llm_semaphore = asyncio.Semaphore(MAX_CONCURRENT_LLM_CALLS)
+        # Cache key -> analysis in progress, so concurrent callers share one run
+        self._inflight: dict[str, asyncio.Future] = {}
     
     def analyze_database(self, neo4j_handler: Neo4jHandler) -> dict[str, Any]:
         """Synchronous wrapper for backward compatibility."""
@@ -48,15 +122,77 @@ class InsightAgent:
                 "suggested_questions": []
             }
 
+        cache_key = self._cache_key(neo4j_handler)
+
+        # Join an analysis of the same database already in flight on this loop
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.get(cache_key)
+        if inflight is not None and inflight.get_loop() is loop:
+            console.print("[dim]Waiting for the schema analysis already in progress...[/dim]")
+            # Shield so a cancelled follower does not cancel the shared analysis
+            return await asyncio.shield(inflight)
+
+        future = loop.create_future()
+        # Mark any exception as retrieved even when no follower awaited it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._inflight[cache_key] = future
+        try:
+            result = await self._analyze_database_uncached(neo4j_handler, cache_key)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self._inflight.get(cache_key) is future:
+                del self._inflight[cache_key]
+
+    async def _analyze_database_uncached(self, neo4j_handler: Neo4jHandler, cache_key: str) -> dict[str, Any]:
+        """Run the analysis for a connected database, consulting the insight cache first."""
         # Use centralized cache manager
         cache_manager = get_cache_manager()
-        cache_key = create_cache_key(neo4j_handler.uri, neo4j_handler.database, "insights")
 
-        # Try to get from cache
+        # The label and relationship type names fingerprint the schema, so a cached
+        # analysis of a schema that has since changed is not served
+        schema_names = await self._fetch_schema_names_async(neo4j_handler)
+        fingerprint = _schema_fingerprint(*schema_names) if schema_names is not None else None
+
+        # Try to get from cache; entries also expire with the cache manager's max age
         cached_data = cache_manager.get(cache_key)
-        if cached_data:
+        if (
+            isinstance(cached_data, dict)
+            and "insights" in cached_data
+            and (fingerprint is None or cached_data.get("schema_fingerprint") == fingerprint)
+        ):
             console.print("[dim]Loaded schema insights from cache.[/dim]")
-            return cached_data
+            return cached_data["insights"]
+
+        # A schema that only drifted slightly (a label added to a large graph) keeps its
+        # summary and questions; only the schema text itself is re-extracted
+        reusable = self._reusable_insights(cached_data, schema_names)
+        if reusable is not None:
+            try:
+                raw_schema = await self._extract_raw_schema_async(neo4j_handler)
+            except Exception as e:
+                console.print(f"[yellow]Warning: Could not refresh schema: {e}[/yellow]")
+            else:
+                result = {**reusable, "raw_schema": raw_schema}
+                try:
+                    cache_manager.put(cache_key, {
+                        "schema_fingerprint": fingerprint,
+                        # Keep comparing against the schema the insights were written for,
+                        # so small changes cannot add up unnoticed
+                        "schema_names": cached_data["schema_names"],
+                        "insights": result,
+                    })
+                except Exception as e:
+                    console.print(f"[yellow]Warning: Could not save to cache: {e}[/yellow]")
+                console.print("[dim]Reused cached insights for a near-identical schema.[/dim]")
+                return result
 
         try:
             # We use a simple print here instead of Progress because this runs in background
@@ -67,14 +203,31 @@ class InsightAgent:
             
             console.print("[dim cyan]🔍 Insight Agent started mapping database...[/dim cyan]")
 
-            # Step 1: Raw Schema Extraction
-            raw_schema = await self._extract_raw_schema_async(neo4j_handler)
-            
-            # Step 2: Semantic Summary Generation
-            summary = await self._generate_summary_async(raw_schema)
-            
-            # Step 3: Question Suggestion
-            questions = await self._suggest_questions_async(raw_schema, summary)
+            # Step 1: Raw Schema Extraction; the count scans run while the summary is generated
+            schema_task = asyncio.create_task(self._extract_raw_schema_async(neo4j_handler))
+            summary_task = None
+            try:
+                # The domain summary only needs names, which came back long before the counts
+                if schema_names is not None and any(schema_names):
+                    summary_task = asyncio.create_task(
+                        self._generate_summary_async(self._format_schema_names(*schema_names), names_only=True)
+                    )
+                raw_schema = await schema_task
+
+                # Nothing to describe (fresh database) or nothing extracted: skip both LLM calls
+                if "- **" not in raw_schema:
+                    console.print("[dim]No labels or relationships found; skipping schema analysis.[/dim]")
+                    return self._trivial_insights(raw_schema)
+                
+                # Step 2: Semantic Summary and Question Suggestion, overlapped; both only need the schema
+                summary, questions = await asyncio.gather(
+                    summary_task or self._generate_summary_async(raw_schema),
+                    self._suggest_questions_async(raw_schema),
+                )
+            finally:
+                for task in (schema_task, summary_task):
+                    if task is not None and not task.done():
+                        task.cancel()
             
             result = {
                 "raw_schema": raw_schema,
@@ -84,7 +237,11 @@ class InsightAgent:
 
             # Save to centralized cache
             try:
-                cache_manager.put(cache_key, result)
+                cache_manager.put(cache_key, {
+                    "schema_fingerprint": fingerprint,
+                    "schema_names": list(schema_names) if schema_names is not None else None,
+                    "insights": result,
+                })
             except Exception as e:
                 console.print(f"[yellow]Warning: Could not save to cache: {e}[/yellow]")
 
@@ -99,87 +256,282 @@ class InsightAgent:
                 "suggested_questions": []
             }
 
+    @staticmethod
+    def _trivial_insights(raw_schema: str) -> dict[str, Any]:
+        """Canned insights for a schema with nothing in it, returned without calling the worker model."""
+        if raw_schema.startswith("Error extracting schema"):
+            summary = "Database summary unavailable."
+        else:
+            summary = "The database is empty."
+        return {
+            "raw_schema": raw_schema,
+            "summary": summary,
+            "suggested_questions": []
+        }
+
+    @staticmethod
+    def _reusable_insights(cached_data: Any, schema_names: Optional[tuple[list[str], list[str]]]) -> Optional[dict[str, Any]]:
+        """
+        Return cached insights written for a schema close enough to the current one.
+
+        Args:
+            cached_data: Cache entry for this database, in any format
+            schema_names: Current (labels, relationship types), or None if unknown
+
+        Returns:
+            The cached insights, or None if there is no close match
+        """
+        if schema_names is None or not isinstance(cached_data, dict) or "insights" not in cached_data:
+            return None
+        cached_names = cached_data.get("schema_names")
+        if not cached_names or len(cached_names) != 2:
+            return None
+        if _schema_similarity(tuple(cached_names), schema_names) < SCHEMA_REUSE_THRESHOLD:
+            return None
+        return cached_data["insights"]
+
+    @staticmethod
+    def _cache_key(neo4j: Neo4jHandler) -> str:
+        """Cache key for a database's insights."""
+        return create_cache_key(neo4j.uri, neo4j.database, "insights")
+
+    def invalidate_cache(self, neo4j: Neo4jHandler) -> bool:
+        """Drop the cached insights for a database so the next analysis starts fresh."""
+        return get_cache_manager().invalidate(self._cache_key(neo4j))
+
+    async def _fetch_schema_names_async(self, neo4j: Neo4jHandler) -> Optional[tuple[list[str], list[str]]]:
+        """
+        Fetch just the label and relationship type names, which needs no data scan.
+
+        Returns sorted (labels, relationship types), or None if the lookup failed.
+        """
+        try:
+            async with neo4j.driver.session(database=neo4j.database) as session:
+                # Aggregating subqueries always yield a row, even with no labels or types
+                result = await session.run("""
+                CALL { CALL db.labels() YIELD label RETURN collect(label) as labels }
+                CALL { CALL db.relationshipTypes() YIELD relationshipType RETURN collect(relationshipType) as types }
+                RETURN labels, types
+                """)
+                record = await result.single()
+        except Exception:
+            # The full extraction reports errors; callers just go without the names
+            return None
+        if not record:
+            return None
+        return sorted(record["labels"]), sorted(record["types"])
+
+    @staticmethod
+    def _format_schema_names(labels: list[str], types: list[str]) -> str:
+        """Render label and relationship type names as schema markdown without stats."""
+        parts = ["## Node Labels", *(f"- **{label}**" for label in labels)]
+        parts.append("\n## Relationships")
+        parts.extend(f"- **{r_type}**" for r_type in types)
+        return "\n".join(parts)
+
     async def _extract_raw_schema_async(self, neo4j: Neo4jHandler) -> str:
-        """Extract detailed schema stats from Neo4j using optimized single-session queries."""
-        schema_parts = []
+        """Extract detailed schema stats from Neo4j, querying labels and relationships concurrently."""
+        # APOC reads the counts from the store's counters instead of scanning per label
+        stats = await self._apoc_stats_async(neo4j)
+        if stats is not None:
+            return await self._schema_from_stats_async(neo4j, *stats)
+        
+        concurrent = await self._supports_concurrent_calls_async(neo4j)
+        (label_lines, label_error), (rel_lines, rel_error) = await asyncio.gather(
+            self._extract_labels_async(neo4j, concurrent),
+            self._extract_rels_async(neo4j, concurrent),
+        )
+        if label_error is not None and rel_error is not None:
+            return f"Error extracting schema: {str(label_error)}"
         
+        return "\n".join(["## Node Labels", *label_lines, "\n## Relationships", *rel_lines])
+
+    async def _apoc_stats_async(self, neo4j: Neo4jHandler) -> Optional[tuple[dict[str, int], dict[str, int]]]:
+        """
+        Read label and relationship type counts with apoc.meta.stats.
+
+        Returns (label counts, relationship type counts), or None when APOC is unavailable
+        or the call fails, in which case the counting queries are used instead.
+        """
+        if neo4j.uri in self._apoc_missing:
+            return None
         try:
             async with neo4j.driver.session(database=neo4j.database) as session:
-                # 1. Get Node Labels and Counts (Optimized)
-                label_query = """
+                result = await session.run(
+                    "CALL apoc.meta.stats() YIELD labels, relTypesCount RETURN labels, relTypesCount"
+                )
+                record = await result.single()
+        except Exception as e:
+            if getattr(e, "code", None) == "Neo.ClientError.Procedure.ProcedureNotFound":
+                self._apoc_missing.add(neo4j.uri)
+            return None
+        if not record:
+            return None
+        return dict(record["labels"] or {}), dict(record["relTypesCount"] or {})
+
+    async def _schema_from_stats_async(
+        self, neo4j: Neo4jHandler, label_counts: dict[str, int], rel_counts: dict[str, int]
+    ) -> str:
+        """Format counter-based stats, sampling properties for all non-empty labels in one query."""
+        samples = {}
+        sampled_labels = [label for label, count in label_counts.items() if count > 0]
+        if sampled_labels:
+            try:
+                async with neo4j.driver.session(database=neo4j.database) as session:
+                    samples = await self._sample_label_keys_async(session, sampled_labels)
+            except Exception as e:
+                console.print(f"[yellow]Warning: Property sampling error: {str(e)}[/yellow]")
+        
+        parts = ["## Node Labels"]
+        for label in sorted(label_counts):
+            count = label_counts[label]
+            if count > 0:
+                prop_list = samples.get(label, [])
+                parts.append(f"- **{label}**: {count:,} nodes. Properties: {', '.join(prop_list[:5])}")
+            else:
+                parts.append(f"- **{label}**: 0 nodes.")
+        parts.append("\n## Relationships")
+        parts.extend(f"- **{r_type}**: {rel_counts[r_type]:,} connections." for r_type in sorted(rel_counts))
+        return "\n".join(parts)
+
+    async def _supports_concurrent_calls_async(self, neo4j: Neo4jHandler) -> bool:
+        """Check once per server whether CALL {} IN CONCURRENT TRANSACTIONS is available."""
+        supported = self._concurrent_call_support.get(neo4j.uri)
+        if supported is not None:
+            return supported
+        
+        supported = False
+        try:
+            async with neo4j.driver.session(database=neo4j.database) as session:
+                result = await session.run(
+                    "CALL dbms.components() YIELD name, versions "
+                    "WHERE name = 'Neo4j Kernel' RETURN versions[0] as version"
+                )
+                record = await result.single()
+            if record and record["version"]:
+                # "5.21.0", "5.26.1-aura" or calendar versions such as "2025.01.0"
+                major, minor = (int(part) for part in record["version"].split("-")[0].split(".")[:2])
+                supported = (major, minor) >= CONCURRENT_CALL_MIN_VERSION
+        except Exception:
+            # Unknown version: the plain CALL {} form works everywhere
+            pass
+        self._concurrent_call_support[neo4j.uri] = supported
+        return supported
+
+    @staticmethod
+    def _call_suffix(concurrent: bool) -> str:
+        """Clause that lets the server fan count subqueries out over worker threads."""
+        if not concurrent:
+            return ""
+        return f" IN CONCURRENT TRANSACTIONS OF {CONCURRENT_CALL_BATCH_ROWS} ROWS"
+
+    async def _extract_labels_async(
+        self, neo4j: Neo4jHandler, concurrent: bool = False
+    ) -> tuple[list[str], Optional[Exception]]:
+        """Describe node labels in their own session; returns (markdown lines, error or None)."""
+        lines = []
+        try:
+            async with neo4j.driver.session(database=neo4j.database) as session:
+                # Node Labels and Counts, then one property sample query for all non-empty labels
+                label_query = f"""
                 CALL db.labels() YIELD label
-                CALL {
+                CALL {{
                     WITH label
                     MATCH (n) WHERE label IN labels(n)
                     RETURN count(n) as count
-                }
+                }}{self._call_suffix(concurrent)}
                 RETURN label, count
                 ORDER BY label
                 """
                 
                 result = await session.run(label_query)
-                schema_parts.append("## Node Labels")
+                label_counts = [(record["label"], record["count"]) async for record in result]
                 
-                # Collect all labels first to ensure result consumption
-                labels_data = [record async for record in result]
+                samples = {}
+                try:
+                    samples = await self._sample_label_keys_async(
+                        session, [label for label, count in label_counts if count > 0]
+                    )
+                except Exception as e:
+                    console.print(f"[yellow]Warning: Property sampling error: {str(e)}[/yellow]")
                 
-                for record in labels_data:
-                    label = record["label"]
-                    count = record["count"]
-                    
+                for label, count in label_counts:
                     if count > 0:
-                        # Get properties sample in the same session
-                        props_res = await session.run(f"MATCH (n:`{label}`) RETURN keys(n) as k LIMIT 1")
-                        props_rec = await props_res.single()
-                        prop_list = props_rec["k"] if props_rec else []
-                        schema_parts.append(f"- **{label}**: {count:,} nodes. Properties: {', '.join(prop_list[:5])}")
+                        prop_list = samples.get(label, [])
+                        lines.append(f"- **{label}**: {count:,} nodes. Properties: {', '.join(prop_list[:5])}")
                     else:
-                        schema_parts.append(f"- **{label}**: 0 nodes.")
+                        lines.append(f"- **{label}**: 0 nodes.")
+        except Exception as e:
+            console.print(f"[yellow]Warning: Schema extraction error (labels): {str(e)}[/yellow]")
+            lines.append(f"- Error fetching labels: {str(e)}")
+            return lines, e
+        return lines, None
+
+    @staticmethod
+    async def _sample_label_keys_async(session, labels: list[str]) -> dict[str, list[str]]:
+        """
+        Fetch one node's property keys per label in a single query.
 
-                # 2. Get Relationships and Counts
-                rel_query = """
+        Each label gets its own UNION ALL branch with a literal label, so every
+        branch is a label scan rather than a scan of all nodes filtered on labels(n).
+        """
+        if not labels:
+            return {}
+        branches = []
+        for i, label in enumerate(labels):
+            safe_label = label.replace('`', '``')
+            branches.append(f"""
+                MATCH (n:`{safe_label}`)
+                WITH n LIMIT 1
+                RETURN {i} as idx, keys(n) as sampleKeys""")
+        query = "CALL {" + "\n                UNION ALL".join(branches) + "\n            }\n            RETURN idx, sampleKeys"
+        result = await session.run(query)
+        return {labels[record["idx"]]: record["sampleKeys"] or [] async for record in result}
+
+    async def _extract_rels_async(
+        self, neo4j: Neo4jHandler, concurrent: bool = False
+    ) -> tuple[list[str], Optional[Exception]]:
+        """Describe relationship types in their own session; returns (markdown lines, error or None)."""
+        lines = []
+        try:
+            async with neo4j.driver.session(database=neo4j.database) as session:
+                rel_query = f"""
                 CALL db.relationshipTypes() YIELD relationshipType
-                CALL {
+                CALL {{
                     WITH relationshipType
                     MATCH ()-[r]->() WHERE type(r) = relationshipType
                     RETURN count(r) as count
-                }
+                }}{self._call_suffix(concurrent)}
                 RETURN relationshipType, count
                 ORDER BY relationshipType
                 """
                 
                 result = await session.run(rel_query)
-                schema_parts.append("\n## Relationships")
                 
                 async for record in result:
                     r_type = record["relationshipType"]
                     count = record["count"]
-                    schema_parts.append(f"- **{r_type}**: {count:,} connections.")
-                    
+                    lines.append(f"- **{r_type}**: {count:,} connections.")
         except Exception as e:
-            console.print(f"[yellow]Warning: Schema extraction error: {str(e)}[/yellow]")
-            return f"Error extracting schema: {str(e)}"
-            
-        return "\n".join(schema_parts)
+            console.print(f"[yellow]Warning: Schema extraction error (relationships): {str(e)}[/yellow]")
+            lines.append(f"- Error fetching relationships: {str(e)}")
+            return lines, e
+        return lines, None
 
-    async def _generate_summary_async(self, schema_text: str) -> str:
-        """Use worker model to summarize the domain asynchronously with retry logic."""
-        prompt = f"""You are a Database Analyst. Analyze the following Neo4j schema and provide a concise, high-level summary of what this database represents.
-        
-        Identify:
-        1. The main domain (e.g., "Healthcare", "Movies", "Finance").
-        2. The core entities and how they relate.
-        3. Any interesting data volume stats.
-        
-        Schema:
-        {schema_text}
-        
-        Output a short paragraph (max 3 sentences)."""
+    async def _generate_summary_async(self, schema_text: str, names_only: bool = False) -> str:
+        """
+        Use worker model to summarize the domain asynchronously with retry logic.
+
+        With names_only the schema carries no counts, so the prompt does not ask for volume stats.
+        """
+        template = _NAMES_SUMMARY_PROMPT_TEMPLATE if names_only else _SUMMARY_PROMPT_TEMPLATE
+        prompt = template.format(schema=schema_text)
         
         last_error = None
         for attempt in range(MAX_LLM_RETRIES):
             try:
-                response = await self.worker_model.generate_content_async(prompt)
+                async with self._llm_semaphore:
+                    response = await self.worker_model.generate_content_async(prompt)
                 if hasattr(response, 'text'):
                     return response.text.strip()
                 elif hasattr(response, 'content'):
@@ -187,33 +539,31 @@ class InsightAgent:
                 return "Summary generation failed (No text response)."
             except Exception as e:
                 last_error = e
-                error_str = str(e).lower()
                 # Check if error is retryable
-                if any(pattern in error_str for pattern in ['timeout', 'cancelled', '504', '503', '502', '500']):
+                if _RETRYABLE_RE.search(str(e)):
                     if attempt < MAX_LLM_RETRIES - 1:
                         console.print(f"[dim yellow]⚠️  Summary generation retry {attempt + 1}/{MAX_LLM_RETRIES}...[/dim yellow]")
-                        await asyncio.sleep(LLM_RETRY_DELAY * (attempt + 1))
+                        await asyncio.sleep(_retry_delay(attempt))
                         continue
                 break
         
         console.print(f"[yellow]Warning: Summary generation error: {str(last_error)[:100]}[/yellow]")
         return "Database summary unavailable."
 
-    async def _suggest_questions_async(self, schema_text: str, summary: str) -> list[str]:
-        """Generate starting questions based on schema asynchronously with retry logic."""
-        prompt = f"""Based on this database schema and summary, suggest 3 interesting natural language questions a user might want to ask.
-
-        Summary: {summary}
-
-        Schema:
-        {schema_text}
+    async def _suggest_questions_async(self, schema_text: str, summary: Optional[str] = None) -> list[str]:
+        """
+        Generate starting questions based on schema asynchronously with retry logic.
 
-        Output ONLY a list of 3 questions, one per line. No numbering or bullets."""
+        The summary is optional flavour text, so callers can run this alongside summary generation.
+        """
+        summary_block = f"Summary: {summary}\n\n" if summary else ""
+        prompt = _QUESTIONS_PROMPT_TEMPLATE.format(schema=schema_text, summary_block=summary_block)
 
         last_error = None
         for attempt in range(MAX_LLM_RETRIES):
             try:
-                response = await self.worker_model.generate_content_async(prompt)
+                async with self._llm_semaphore:
+                    response = await self.worker_model.generate_content_async(prompt)
                 text = ""
                 if hasattr(response, 'text'):
                     text = response.text
@@ -226,38 +576,12 @@ class InsightAgent:
                 return []
             except Exception as e:
                 last_error = e
-                error_str = str(e).lower()
                 # Check if error is retryable
-                if any(pattern in error_str for pattern in ['timeout', 'cancelled', '504', '503', '502', '500']):
+                if _RETRYABLE_RE.search(str(e)):
                     if attempt < MAX_LLM_RETRIES - 1:
-                        await asyncio.sleep(LLM_RETRY_DELAY * (attempt + 1))
+                        await asyncio.sleep(_retry_delay(attempt))
                         continue
                 break
         
         console.print(f"[yellow]Warning: Question suggestion error: {str(last_error)[:100] if last_error else 'Unknown'}[/yellow]")
         return []
-
-    def _extract_raw_schema(self, neo4j: Neo4jHandler) -> str:
-        """Synchronous wrapper for raw schema extraction."""
-        try:
-            return asyncio.get_event_loop().run_until_complete(self._extract_raw_schema_async(neo4j))
-        except RuntimeError:
-             # If loop is already running, we can't use run_until_complete
-             # But since this is a wrapper, we should assume it's called from sync code.
-             # If called from async code, user should use _async version.
-             # We can try to use asyncio.run if no loop is running, or create a new loop.
-             return asyncio.run(self._extract_raw_schema_async(neo4j))
-
-    def _generate_summary(self, schema_text: str) -> str:
-        """Synchronous wrapper for summary generation."""
-        try:
-            return asyncio.get_event_loop().run_until_complete(self._generate_summary_async(schema_text))
-        except RuntimeError:
-            return asyncio.run(self._generate_summary_async(schema_text))
-
-    def _suggest_questions(self, schema_text: str, summary: str) -> list[str]:
-        """Synchronous wrapper for question suggestion."""
-        try:
-            return asyncio.get_event_loop().run_until_complete(self._suggest_questions_async(schema_text, summary))
-        except RuntimeError:
-            return asyncio.run(self._suggest_questions_async(schema_text, summary))
@@ -2,13 +2,20 @@ import os
 import yaml
 import abc
 import asyncio
+import functools
+import hashlib
+import random
 import re
 from typing import Any, Optional
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
 import logging
 
+from graphbot.services.cache_manager import CacheManager, create_cache_key, get_cache_manager
+
 # Set up logging
 logger = logging.getLogger(__name__)
+# Server-suggested wait, e.g. "Please retry in 12.5s"
+_RETRY_RE = re.compile(r'retry[^\d]*(\d+(?:\.\d+)?)\s*s', re.IGNORECASE)
 
 # Custom exceptions for better error handling
 class LLMError(Exception):
@@ -46,11 +53,19 @@ class LLMResponse:
 class LLMProvider(abc.ABC):
     """Abstract base class for LLM providers."""
     
-    def __init__(self, config: dict[str, Any]):
+    def __init__(self, config: dict[str, Any], response_cache: Optional[CacheManager] = None):
         self.config = config
         self.api_key = os.getenv(config.get('api_key_env_var', ''), '')
         self.main_model = config['models'].get('main')
         self.worker_model = config['models'].get('worker')
+        # Exact-match cache of generated text; None disables it
+        self.response_cache = response_cache
+
+    @staticmethod
+    def _response_cache_key(model_name: str, prompt: str) -> str:
+        """Cache key for a model's response to an exact prompt."""
+        digest = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+        return create_cache_key(model_name, digest, "llm_response")
 
     @abc.abstractmethod
     async def generate_text(self, prompt: str, system_instruction: Optional[str] = None, is_worker: bool = False) -> LLMResponse:
@@ -81,14 +96,26 @@ class GeminiProvider(LLMProvider):
         "internal error",
         "stream",
     ]
+    # Compiled once: status codes match as whole numbers anywhere in an error message
+    _STATUS_RE = re.compile(r'(?<!\d)(' + '|'.join(map(str, sorted(RETRYABLE_STATUS_CODES))) + r')(?!\d)')
+    _RETRYABLE_PATTERN_RE = re.compile("|".join(map(re.escape, RETRYABLE_ERROR_PATTERNS)))
     
-    def __init__(self, config: dict[str, Any]):
-        super().__init__(config)
+    def __init__(self, config: dict[str, Any], response_cache: Optional[CacheManager] = None):
+        super().__init__(config, response_cache)
         import google.generativeai as genai
         if not self.api_key:
             raise LLMAuthenticationError(f"API key not found for {config.get('provider')}")
         genai.configure(api_key=self.api_key)
         self.genai = genai
+        # Model name -> GenerativeModel, built once and reused by every call
+        self._models: dict[str, Any] = {}
+
+    def _get_model(self, model_name: str) -> Any:
+        """Return the shared GenerativeModel for a model name, creating it on first use."""
+        model = self._models.get(model_name)
+        if model is None:
+            model = self._models[model_name] = self.genai.GenerativeModel(model_name)
+        return model
 
     def _classify_error(self, error: Exception) -> tuple[type, Optional[float]]:
         """
@@ -97,30 +124,29 @@ class GeminiProvider(LLMProvider):
         Returns:
             Tuple of (exception_class, retry_after_seconds or None)
         """
-        error_str = str(error).lower()
+        message = str(error)
+        error_str = message.lower()
         
         # Check for status codes in error message
-        for code in self.RETRYABLE_STATUS_CODES:
-            if str(code) in str(error):
-                if code == 429:
-                    retry_after = self._extract_retry_time(str(error))
-                    return (LLMRateLimitError, retry_after)
-                elif code in {500, 502, 503}:
-                    return (LLMServerError, None)
-                elif code == 504:
-                    return (LLMTimeoutError, None)
+        status = self._STATUS_RE.search(message)
+        if status:
+            code = status.group(1)
+            if code == "429":
+                return (LLMRateLimitError, self._extract_retry_time(message))
+            elif code == "504":
+                return (LLMTimeoutError, None)
+            return (LLMServerError, None)
         
         # Check for specific error patterns
-        if "400" in str(error) and ("api key" in error_str or "api_key" in error_str):
+        if "400" in message and ("api key" in error_str or "api_key" in error_str):
             return (LLMAuthenticationError, None)
         
-        if "404" in str(error) or "not found" in error_str:
+        if "404" in message or "not found" in error_str:
             return (LLMModelNotFoundError, None)
         
         # Check for retryable patterns
-        for pattern in self.RETRYABLE_ERROR_PATTERNS:
-            if pattern in error_str:
-                return (LLMTimeoutError, None)
+        if self._RETRYABLE_PATTERN_RE.search(error_str):
+            return (LLMTimeoutError, None)
         
         # Default to generic LLMError
         return (LLMError, None)
@@ -128,17 +154,17 @@ class GeminiProvider(LLMProvider):
     def _extract_retry_time(self, error_str: str) -> Optional[float]:
         """Extract retry time from error message if present."""
         try:
-            match = re.search(r'retry[^\d]*(\d+(?:\.\d+)?)\s*s', error_str.lower())
+            match = _RETRY_RE.search(error_str)
             if match:
                 return float(match.group(1))
         except (ValueError, AttributeError):
             pass
         return None
     
-    def _is_retryable(self, error: Exception) -> bool:
-        """Check if an error is retryable."""
-        error_class, _ = self._classify_error(error)
-        # Don't retry authentication or model-not-found errors
+    @staticmethod
+    def _is_retryable(error_class: type) -> bool:
+        """Check if an error class from _classify_error is retryable."""
+        # Don't retry authentication or model-not-found errors; they never succeed on retry
         return error_class not in (LLMAuthenticationError, LLMModelNotFoundError)
 
     async def generate_text(self, prompt: str, system_instruction: Optional[str] = None, is_worker: bool = False) -> LLMResponse:
@@ -150,11 +176,19 @@ class GeminiProvider(LLMProvider):
         if system_instruction:
             final_prompt = f"{system_instruction}\n\n{prompt}"
 
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self._response_cache_key(model_name, final_prompt)
+            cached = self.response_cache.get(cache_key)
+            if isinstance(cached, dict):
+                logger.debug("Response cache hit for %s", model_name)
+                return LLMResponse(**cached)
+
         last_error = None
         
         for attempt in range(self.MAX_RETRIES):
             try:
-                model = self.genai.GenerativeModel(model_name)
+                model = self._get_model(model_name)
                 response = await model.generate_content_async(final_prompt)
                 
                 text = ""
@@ -172,7 +206,10 @@ class GeminiProvider(LLMProvider):
                         'total_tokens': response.usage_metadata.total_token_count
                     }
 
-                return LLMResponse(content=text, token_usage=usage, model_name=model_name)
+                result = LLMResponse(content=text, token_usage=usage, model_name=model_name)
+                if cache_key is not None and text:
+                    self.response_cache.put(cache_key, asdict(result))
+                return result
                 
             except Exception as e:
                 last_error = e
@@ -181,8 +218,8 @@ class GeminiProvider(LLMProvider):
                 # Log the error
                 logger.warning(f"Gemini API error (attempt {attempt + 1}/{self.MAX_RETRIES}): {e}")
                 
-                # Check if we should retry
-                if not self._is_retryable(e) or attempt == self.MAX_RETRIES - 1:
+                # Check if we should retry, reusing the classification above
+                if not self._is_retryable(error_class) or attempt == self.MAX_RETRIES - 1:
                     # Convert to appropriate exception type
                     if error_class == LLMAuthenticationError:
                         raise LLMAuthenticationError(
@@ -208,11 +245,12 @@ class GeminiProvider(LLMProvider):
                     else:
                         raise LLMError(f"LLM generation failed: {str(e)[:200]}") from e
                 
-                # Calculate retry delay with exponential backoff
+                # Calculate retry delay: the server's hint when given, otherwise exponential
+                # backoff with full jitter so concurrent retriers do not hit the limit together
                 if retry_after:
                     delay = min(retry_after, self.MAX_RETRY_DELAY)
                 else:
-                    delay = min(self.BASE_RETRY_DELAY * (2 ** attempt), self.MAX_RETRY_DELAY)
+                    delay = random.uniform(0, min(self.BASE_RETRY_DELAY * (2 ** attempt), self.MAX_RETRY_DELAY))
                 
                 logger.info(f"Retrying in {delay:.1f}s...")
                 await asyncio.sleep(delay)
@@ -223,8 +261,9 @@ class GeminiProvider(LLMProvider):
     async def count_tokens(self, text: str) -> int:
         """Count tokens with error handling."""
         try:
-            model = self.genai.GenerativeModel(self.main_model)
-            return model.count_tokens(text).total_tokens
+            model = self._get_model(self.main_model)
+            # The async call keeps the event loop free during the round-trip
+            return (await model.count_tokens_async(text)).total_tokens
         except Exception as e:
             logger.warning(f"Token counting failed, using estimate: {e}")
             # Fallback to rough estimate (~4 chars per token)
@@ -283,6 +322,22 @@ class AnthropicProvider(LLMProvider):
     async def count_tokens(self, text: str) -> int:
         return len(text.split())
 
+@functools.lru_cache(maxsize=8)
+def _load_yaml(config_path: str, mtime_ns: int) -> dict[str, Any]:
+    """Parse a YAML file; the modification time is only part of the cache key."""
+    with open(config_path, 'r') as f:
+        return yaml.safe_load(f)
+
+
+def load_config(config_path: str) -> dict[str, Any]:
+    """
+    Load the providers config, parsing the file again only after it changes.
+
+    The returned dict is shared between callers and must not be modified.
+    """
+    return _load_yaml(config_path, os.stat(config_path).st_mtime_ns)
+
+
 class LLMFactory:
     @classmethod
     def get_provider(cls, config_path: str = "config/providers.yaml") -> LLMProvider:
@@ -290,8 +345,7 @@ class LLMFactory:
         if not os.path.exists(config_path):
             raise FileNotFoundError(f"Config file not found: {config_path}")
             
-        with open(config_path, 'r') as f:
-            full_config = yaml.safe_load(f)
+        full_config = load_config(config_path)
             
         active_profile_name = full_config.get('active_profile')
         profile_config = full_config['profiles'].get(active_profile_name)
@@ -300,9 +354,11 @@ class LLMFactory:
             raise ValueError(f"Active profile '{active_profile_name}' not defined in profiles.")
             
         provider_type = profile_config.get('provider')
+        # Opt-in per profile: identical prompts are answered from the shared cache
+        response_cache = get_cache_manager() if profile_config.get('cache_responses') else None
         
         if provider_type == 'google':
-            return GeminiProvider(profile_config)
+            return GeminiProvider(profile_config, response_cache)
         elif provider_type == 'openai':
             return OpenAIProvider(profile_config)
         elif provider_type == 'anthropic':
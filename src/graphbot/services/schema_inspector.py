@@ -9,6 +9,10 @@ console = Console()
 # Constants
 MAX_INSPECTION_RETRIES = 2
 INSPECTION_RETRY_DELAY = 0.5
+# Value probes run against the database at once by interactive_check
+MAX_CONCURRENT_INSPECTIONS = 8
+# Sample values that suggest a flag/boolean property
+_BOOL_TOKENS = frozenset({'true', 'false', 'yes', 'no', '1', '0'})
 
 
 class SchemaInspector:
@@ -66,6 +70,45 @@ class SchemaInspector:
         console.print(f"[yellow]⚠️  Could not inspect values: {str(last_error)[:100] if last_error else 'Unknown error'}[/yellow]")
         return []
 
+    async def inspect_value_distributions(self, pairs: list[tuple[str, str]], limit: int = 10) -> list[list[Any]]:
+        """
+        Fetch distinct value samples for many (label, property) pairs in one query.
+
+        Each pair becomes a UNION ALL branch of a single CALL subquery, so every probe keeps
+        its label scan while the whole batch costs one round-trip.
+        
+        Args:
+            pairs: (label, property) pairs to sample
+            limit: Max number of samples per pair
+            
+        Returns:
+            Distinct values for each pair, in the order given
+
+        Raises:
+            Exception: If the batched query fails; callers can fall back to per-pair probes
+        """
+        values: list[list[Any]] = [[] for _ in pairs]
+        branches = []
+        for i, (label, prop) in enumerate(pairs):
+            # Pairs with a missing label or property have nothing to sample
+            if not label or not prop:
+                continue
+            safe_label = label.replace('`', '``')
+            safe_prop = prop.replace('`', '``')
+            branches.append(f"""
+            MATCH (n:`{safe_label}`)
+            WHERE n.`{safe_prop}` IS NOT NULL
+            WITH DISTINCT n.`{safe_prop}` as val
+            LIMIT $limit
+            RETURN {i} as idx, collect(val) as vals""")
+        if not branches:
+            return values
+
+        query = "CALL {" + "\n            UNION ALL".join(branches) + "\n        }\n        RETURN idx, vals"
+        for record in await self.neo4j.execute_query_async(query, {"limit": limit}):
+            values[record["idx"]] = record["vals"]
+        return values
+
     async def interactive_check(self, potential_labels: list[str], suspected_properties: list[str]):
         """
         Interactively check values for suspected properties.
@@ -79,29 +122,39 @@ class SchemaInspector:
             return
             
         console.print("\n[bold cyan]🔎 Interactive Schema Inspector[/bold cyan]")
+
+        pairs = [(label, prop) for label in potential_labels for prop in suspected_properties]
+        try:
+            results = await self.inspect_value_distributions(pairs)
+        except Exception as e:
+            console.print(f"[dim yellow]⚠️  Batched inspection failed ({str(e)[:50]}); probing pairs individually...[/dim yellow]")
+            # Probe every pair concurrently, then report in the order they were requested
+            semaphore = asyncio.Semaphore(MAX_CONCURRENT_INSPECTIONS)
+
+            async def probe(label: str, prop: str) -> list[Any]:
+                async with semaphore:
+                    return await self.inspect_value_distribution(label, prop)
+
+            results = await asyncio.gather(*(probe(label, prop) for label, prop in pairs), return_exceptions=True)
         
-        for label in potential_labels:
-            for prop in suspected_properties:
-                try:
-                    console.print(f"Checking [bold]{label}.{prop}[/bold]...")
-                    values = await self.inspect_value_distribution(label, prop)
+        for (label, prop), values in zip(pairs, results):
+            try:
+                console.print(f"Checking [bold]{label}.{prop}[/bold]...")
+                if isinstance(values, Exception):
+                    raise values
+                
+                if values:
+                    # Stringify each value once for both display and the flag heuristic
+                    texts = [str(v) for v in values]
+                    display_values = [text[:50] for text in texts]  # Truncate long values
+                    
+                    console.print(f"  Found sample values: [dim]{', '.join(display_values)}[/dim]")
                     
-                    if values:
-                        # Safely convert values to strings for display
-                        display_values = []
-                        for v in values:
-                            try:
-                                display_values.append(str(v)[:50])  # Truncate long values
-                            except Exception:
-                                display_values.append("<unprintable>")
-                        
-                        console.print(f"  Found sample values: [dim]{', '.join(display_values)}[/dim]")
-                        
-                        # Heuristic: if boolean-like
-                        if any(str(v).lower() in ['true', 'false', 'yes', 'no', '1', '0'] for v in values):
-                            console.print(f"  [green]💡 Hint: This looks like a flag/boolean field.[/green]")
-                    else:
-                        console.print(f"  [dim]No values found or property doesn't exist.[/dim]")
-                        
-                except Exception as e:
-                    console.print(f"  [red]Error checking {label}.{prop}: {str(e)[:50]}[/red]")
+                    # Heuristic: if boolean-like
+                    if any(text.lower() in _BOOL_TOKENS for text in texts):
+                        console.print(f"  [green]💡 Hint: This looks like a flag/boolean field.[/green]")
+                else:
+                    console.print(f"  [dim]No values found or property doesn't exist.[/dim]")
+                    
+            except Exception as e:
+                console.print(f"  [red]Error checking {label}.{prop}: {str(e)[:50]}[/red]")
@@ -10,6 +10,26 @@ from unittest.mock import patch
 from graphbot.services.cache_manager import CacheManager, create_cache_key
 
 
+class FakeClock:
+    """Manually advanced clock so expiry tests need neither sleeps nor patched time."""
+
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+        self.calls = 0
+
+    def __call__(self) -> float:
+        self.calls += 1
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
 @pytest.fixture
 def temp_cache_file():
     """Create a temporary cache file for testing."""
@@ -22,13 +42,28 @@ def temp_cache_file():
 
 
 @pytest.fixture
-def cache_manager(temp_cache_file):
-    """Create a cache manager with a temporary file."""
-    return CacheManager(
-        cache_file=temp_cache_file,
+def cache_manager(clock):
+    """Create an in-memory cache manager on a fake clock."""
+    manager = CacheManager(
+        cache_file=None,
         max_age_hours=1,  # 1 hour for testing
+        max_entries=10,
+        clock=clock
+    )
+    yield manager
+    manager.close()
+
+
+@pytest.fixture
+def file_cache_manager(temp_cache_file):
+    """Create a cache manager with a temporary file, for persistence tests."""
+    manager = CacheManager(
+        cache_file=temp_cache_file,
+        max_age_hours=1,
         max_entries=10
     )
+    yield manager
+    manager.close()
 
 
 def test_cache_put_and_get(cache_manager):
@@ -49,24 +84,33 @@ def test_cache_miss(cache_manager):
     assert result is None
 
 
-def test_cache_expiration(cache_manager):
+def test_cache_expiration(cache_manager, clock):
     """Test cache expiration."""
     test_data = {"data": "expires"}
 
-    # Put data with very short expiration (1 second ago)
-    with patch('time.time', return_value=time.time() - 3601):  # 1 hour + 1 second ago
-        cache_manager.put("expired_key", test_data)
+    cache_manager.put("expired_key", test_data)
+    clock.advance(3601)  # 1 hour + 1 second later
 
     # Should return None due to expiration
     result = cache_manager.get("expired_key")
     assert result is None
 
 
+def test_cache_expired_entries_evicted_on_access(cache_manager, clock):
+    """Test that due entries are dropped from the expiry heap on any access."""
+    cache_manager.put("old_key", "old")
+    clock.advance(3601)
+    cache_manager.put("fresh_key", "fresh")
+
+    assert cache_manager.get("fresh_key") == "fresh"
+    assert "old_key" not in cache_manager._cache
+
+
 def test_cache_size_limit(cache_manager):
     """Test cache size enforcement."""
     # Create cache manager with very small limit
     small_cache = CacheManager(
-        cache_file=cache_manager.cache_file,
+        cache_file=None,
         max_age_hours=24,
         max_entries=3
     )
@@ -80,6 +124,24 @@ def test_cache_size_limit(cache_manager):
     assert stats['total_entries'] == 3
 
 
+def test_cache_size_limit_evicts_least_recently_used(cache_manager):
+    """Test that reads refresh recency so hot entries survive eviction."""
+    small_cache = CacheManager(
+        cache_file=None,
+        max_age_hours=24,
+        max_entries=2
+    )
+
+    small_cache.put("hot", 1)
+    small_cache.put("cold", 2)
+    small_cache.get("hot")
+    small_cache.put("new", 3)
+
+    assert small_cache.get("hot") == 1
+    assert small_cache.get("cold") is None
+    assert small_cache.get("new") == 3
+
+
 def test_cache_invalidation(cache_manager):
     """Test cache invalidation."""
     test_data = {"data": "to_invalidate"}
@@ -100,6 +162,37 @@ def test_cache_invalidation(cache_manager):
     assert result is False
 
 
+def test_cache_invalidation_defers_save(file_cache_manager):
+    """Test that invalidation marks the cache dirty instead of writing immediately."""
+    file_cache_manager.put("deferred_key", "value")
+    file_cache_manager.save_if_dirty()
+
+    with patch.object(file_cache_manager, '_save_cache') as save:
+        file_cache_manager.invalidate("deferred_key")
+        save.assert_not_called()
+
+    assert file_cache_manager._dirty is True
+
+
+def test_cache_background_flush(temp_cache_file):
+    """Test that the background thread persists pending changes."""
+    manager = CacheManager(cache_file=temp_cache_file, flush_interval=0.01)
+    try:
+        manager.put("flushed_key", "value")
+
+        deadline = time.time() + 2
+        while manager._dirty and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        manager.close()
+
+    reloaded = CacheManager(cache_file=temp_cache_file)
+    try:
+        assert reloaded.get("flushed_key") == "value"
+    finally:
+        reloaded.close()
+
+
 def test_cache_clear(cache_manager):
     """Test cache clearing."""
     # Add some data
@@ -116,7 +209,7 @@ def test_cache_clear(cache_manager):
     assert stats['total_entries'] == 0
 
 
-def test_cache_stats(cache_manager):
+def test_cache_stats(cache_manager, clock):
     """Test cache statistics."""
     # Empty cache stats
     stats = cache_manager.get_stats()
@@ -125,7 +218,7 @@ def test_cache_stats(cache_manager):
 
     # Add some data (put operations count as initial access)
     cache_manager.put("stats_key1", "stats_value1")
-    time.sleep(0.01)  # Small delay for timestamp difference
+    clock.advance(1)  # Distinct timestamps
     cache_manager.put("stats_key2", "stats_value2")
 
     # Access one item multiple times
@@ -139,7 +232,29 @@ def test_cache_stats(cache_manager):
     assert stats['oldest_entry'] < stats['newest_entry']
 
 
-def test_cache_list_entries(cache_manager):
+def test_cache_stats_track_mutations(cache_manager, clock):
+    """Test that the running stats stay in sync across overwrites, removals and eviction."""
+    cache_manager.max_entries = 3
+    for i in range(5):
+        cache_manager.put(f"key{i}", i)
+        clock.advance(1)
+    cache_manager.get("key3")
+    cache_manager.put("key4", "overwritten")
+    cache_manager.invalidate("key2")
+
+    entries = list(cache_manager._cache.values())
+    stats = cache_manager.get_stats()
+    assert stats['total_entries'] == 2
+    assert stats['total_accesses'] == sum(e.access_count for e in entries)
+    assert stats['oldest_entry'] == min(e.timestamp for e in entries)
+    assert stats['newest_entry'] == max(e.timestamp for e in entries)
+
+    cache_manager.invalidate(max(entries, key=lambda e: e.timestamp).key)
+    stats = cache_manager.get_stats()
+    assert stats['oldest_entry'] == stats['newest_entry'] == cache_manager._cache["key3"].timestamp
+
+
+def test_cache_list_entries(cache_manager, clock):
     """Test listing cache entries."""
     # Empty cache
     entries = cache_manager.list_entries()
@@ -150,6 +265,7 @@ def test_cache_list_entries(cache_manager):
     cache_manager.put("list_key2", {"data": "value2"})
 
     # Access one to change ordering
+    clock.advance(1)
     cache_manager.get("list_key1")
 
     entries = cache_manager.list_entries()
@@ -162,6 +278,7 @@ def test_cache_list_entries(cache_manager):
     # Check metadata
     assert all('age_seconds' in entry for entry in entries)
     assert all('access_count' in entry for entry in entries)
+    assert entries[0]['data_size'] == len('{"data": "value1"}')
 
 
 def test_create_cache_key():
@@ -179,23 +296,113 @@ def test_create_cache_key():
     key4 = create_cache_key("bolt://localhost:7687", "neo4j", "insights")
     assert key4 != key1
 
+    # Keys keep the 32-hex-char width used by existing cache files
+    assert len(key1) == 32
+
 
 def test_cache_persistence(temp_cache_file):
     """Test cache persistence across instances."""
     # Create first manager and add data
     manager1 = CacheManager(cache_file=temp_cache_file, max_age_hours=24)
     test_data = {"persistent": "data", "number": 123}
-    manager1.put("persistent_key", test_data)
+    try:
+        manager1.put("persistent_key", test_data)
+    finally:
+        # Closing persists the pending write for the next instance
+        manager1.close()
 
     # Create second manager with same file
     manager2 = CacheManager(cache_file=temp_cache_file, max_age_hours=24)
+    try:
+        # Should be able to retrieve data
+        retrieved = manager2.get("persistent_key")
+        assert retrieved == test_data
+    finally:
+        manager2.close()
 
-    # Should be able to retrieve data
-    retrieved = manager2.get("persistent_key")
-    assert retrieved == test_data
+
+def test_cache_file_is_compact_json(file_cache_manager):
+    """Test that the cache file is written without indentation whitespace."""
+    file_cache_manager.put("compact_key", {"nested": [1, 2, 3]})
+    file_cache_manager.save_if_dirty()
+
+    with open(file_cache_manager.cache_file, 'rb') as f:
+        raw = f.read()
+
+    assert b'\n' not in raw
+    assert b'"nested":[1,2,3]' in raw
+
+
+def test_cache_save_failure_leaves_no_temp_file(file_cache_manager):
+    """Test that a failed save keeps the previous file and removes the temp file."""
+    file_cache_manager.put("ok_key", "ok")
+    file_cache_manager.save_if_dirty()
+
+    file_cache_manager.put("other_key", "other")
+    with patch("graphbot.services.cache_manager.os.replace", side_effect=OSError("disk full")):
+        file_cache_manager.save_if_dirty()
+
+    assert not os.path.exists(file_cache_manager.cache_file + '.tmp')
+    assert file_cache_manager._dirty is True
+
+    reloaded = CacheManager(cache_file=file_cache_manager.cache_file)
+    try:
+        assert reloaded.get("ok_key") == "ok"
+        assert reloaded.get("other_key") is None
+    finally:
+        reloaded.close()
+
+
+def test_cache_cleanup_expires_and_trims_in_one_pass(cache_manager):
+    """Test that cleanup drops expired entries, then evicts the least recently used survivors."""
+    for key in ("a", "b", "c", "d"):
+        cache_manager.put(key, key)
+    cache_manager.get("a")
+    cache_manager._cache["b"].timestamp -= 7200
+    cache_manager.max_entries = 2
+
+    cache_manager.cleanup()
+
+    assert list(cache_manager._cache) == ["d", "a"]
+    assert cache_manager.get_stats()['total_entries'] == 2
+    assert sorted(key for _, key in cache_manager._expiry_heap) == ["a", "d"]
+
+
+def test_cache_expiry_heap_stays_bounded_by_live_entries(cache_manager, clock):
+    """Test that overwrites and evictions do not grow the expiry heap without bound."""
+    for i in range(500):
+        clock.advance(1)
+        cache_manager.put(f"key_{i % 20}", i)
+
+    assert len(cache_manager._cache) == 10
+    assert len(cache_manager._expiry_heap) <= 2 * len(cache_manager._cache)
+    assert cache_manager.get("key_19") == 499
+
+
+def test_cache_put_reads_clock_once(cache_manager, clock):
+    """Test that put stamps creation and access with a single clock reading."""
+    clock.calls = 0
+    cache_manager.put("clock_key", "value")
+
+    entry = cache_manager._cache["clock_key"]
+    assert clock.calls == 1
+    assert entry.timestamp == entry.last_accessed == clock.now
+
+
+def test_cache_without_file_stays_in_memory(clock, tmp_path, monkeypatch):
+    """Test that a cache without a file never touches the disk or starts a flush thread."""
+    monkeypatch.chdir(tmp_path)
+    manager = CacheManager(cache_file=None, clock=clock)
+    manager.put("memory_key", "value")
+    manager.cleanup()
+    manager.close()
+
+    assert manager._flush_thread is None
+    assert manager.get("memory_key") == "value"
+    assert list(tmp_path.iterdir()) == []
 
 
-def test_cache_cleanup(cache_manager):
+def test_cache_cleanup(cache_manager, clock):
     """Test cache cleanup functionality."""
     # Add a valid entry
     cache_manager.put("valid_key", "valid_data")
@@ -205,9 +412,9 @@ def test_cache_cleanup(cache_manager):
     expired_entry = CacheEntry(
         key="expired_key",
         data="expired_data",
-        timestamp=time.time() - 7200,  # 2 hours ago
+        timestamp=clock() - 7200,  # 2 hours ago
         access_count=1,
-        last_accessed=time.time() - 7200
+        last_accessed=clock() - 7200
     )
     cache_manager._cache["expired_key"] = expired_entry
 
@@ -1,8 +1,12 @@
+import asyncio
+import os
+import threading
 import types
+from collections import deque
 
 import pytest
 
-from graphbot.services.gemini_service import GeminiService
+from graphbot.services.gemini_service import CYPHER_BASE_PROMPT, GeminiService
 
 
 class FakeResponse:
@@ -18,19 +22,21 @@ class FakeModelInfo:
 
 
 @pytest.fixture
-def stub_genai(monkeypatch):
+def stub_genai(monkeypatch, tmp_path):
     class FakeModel:
         def __init__(self, name: str):
             self.name = name
             self._next_response = FakeResponse("DEFAULT")
             self.last_prompt = None
+            self.prompts = []
 
-        def generate_content(self, prompt: str):
+        def generate_content(self, prompt: str, **kwargs):
             self.last_prompt = prompt
+            self.prompts.append((prompt, kwargs))
             return self._next_response
 
-        async def generate_content_async(self, prompt: str):
-            return self.generate_content(prompt)
+        async def generate_content_async(self, prompt: str, **kwargs):
+            return self.generate_content(prompt, **kwargs)
 
     def fake_list_models():
         return [
@@ -39,12 +45,25 @@ def stub_genai(monkeypatch):
         ]
 
     monkeypatch.setenv("GEMINI_API_KEY", "AIza" + "A" * 30)
+    monkeypatch.setenv("GRAPHBOT_CACHE_DIR", str(tmp_path / "cache"))
     monkeypatch.setenv("MAIN_MODEL", "gemini-3-pro-preview")
     monkeypatch.setenv("WORKER_MODEL", "gemini-1.5-flash")
     monkeypatch.setattr("graphbot.services.gemini_service.genai.configure", lambda api_key: None)
     monkeypatch.setattr("graphbot.services.gemini_service.genai.list_models", fake_list_models)
     monkeypatch.setattr("graphbot.services.gemini_service.genai.GenerativeModel", FakeModel)
-    return FakeModel
+
+    # Close every service a test builds so sync-wrapper loop threads do not leak
+    services = []
+    original_init = GeminiService.__init__
+
+    def tracking_init(self, *args, **kwargs):
+        original_init(self, *args, **kwargs)
+        services.append(self)
+
+    monkeypatch.setattr(GeminiService, "__init__", tracking_init)
+    yield FakeModel
+    for service in services:
+        service.close()
 
 
 def test_generate_cypher_query_returns_plain_text(stub_genai):
@@ -57,6 +76,20 @@ def test_generate_cypher_query_returns_plain_text(stub_genai):
     assert "Find all nodes" in service.main_model.last_prompt
 
 
+def test_generate_cypher_query_prompt_layout(stub_genai):
+    service = GeminiService()
+
+    service.generate_cypher_query("Find all nodes")
+    assert service.main_model.last_prompt == CYPHER_BASE_PROMPT + "\nUser request: Find all nodes\n\nCypher query:"
+
+    service.generate_cypher_query("Find all users", context="(:User {name})")
+    assert service.main_model.last_prompt == (
+        CYPHER_BASE_PROMPT
+        + "\n### DATABASE SCHEMA:\n(:User {name})\n"
+        + "\nUser request: Find all users\n\nCypher query:"
+    )
+
+
 def test_generate_cypher_query_strips_markdown_code_block(stub_genai):
     service = GeminiService()
     service.main_model._next_response = FakeResponse("```cypher\nMATCH (n)\nRETURN n\n```")
@@ -65,3 +98,674 @@ def test_generate_cypher_query_strips_markdown_code_block(stub_genai):
 
     assert query == "MATCH (n)\nRETURN n"
 
+
+@pytest.mark.parametrize("raw", ["```\nMATCH (n)\n```", "```MATCH (n)```", "```Cypher\nMATCH (n)\n```  "])
+def test_clean_query_response_strips_fence_variants(stub_genai, raw):
+    service = GeminiService()
+
+    assert service._clean_query_response(raw) == "MATCH (n)"
+
+
+def test_extract_retry_time_parses_hint_case_insensitively(stub_genai):
+    service = GeminiService()
+
+    assert service._extract_retry_time("429 Quota exceeded. Please Retry in 12.5s.") == 12.5
+    assert service._extract_retry_time("429 Quota exceeded.") is None
+
+
+def test_error_classifiers_accept_precomputed_lowercase(stub_genai):
+    service = GeminiService()
+    message = "400 Bad Request: API Key not valid"
+
+    assert service._is_api_key_error(message)
+    assert service._is_api_key_error(message, message.lower())
+    assert service._is_rate_limit_error("Resource has been exhausted (e.g. check QUOTA).")
+    assert service._is_model_not_found_error("Model NOT FOUND", "model not found")
+    assert not service._is_rate_limit_error("500 Internal", "500 internal")
+
+
+def test_generate_cypher_query_cache_ignores_whitespace_and_punctuation(stub_genai):
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse("MATCH (u:User) RETURN u.name LIMIT 25")
+
+    first = service.generate_cypher_query("List all users")
+    service.main_model._next_response = FakeResponse("SHOULD NOT BE USED")
+    second = service.generate_cypher_query("  List all   users? ")
+
+    assert first == second == "MATCH (u:User) RETURN u.name LIMIT 25"
+
+
+def test_generate_cypher_query_cache_keeps_literal_case(stub_genai):
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse("MATCH (p:Product {sku: 'AbC-12'}) RETURN p")
+    service.generate_cypher_query('Find product "AbC-12"')
+
+    service.main_model._next_response = FakeResponse("MATCH (p:Product {sku: 'abc-12'}) RETURN p")
+    query = service.generate_cypher_query('Find product "abc-12"')
+
+    assert query == "MATCH (p:Product {sku: 'abc-12'}) RETURN p"
+
+
+def test_generate_cypher_query_cache_is_scoped_by_schema(stub_genai):
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse("MATCH (u:User) RETURN u")
+    service.generate_cypher_query("List all users", context="(:User)")
+
+    service.main_model._next_response = FakeResponse("MATCH (c:Customer) RETURN c")
+    query = service.generate_cypher_query("List all users", context="(:Customer)")
+
+    assert query == "MATCH (c:Customer) RETURN c"
+
+
+def test_generate_cypher_query_cache_evicts_least_recently_used(stub_genai):
+    service = GeminiService()
+    service._cache_size = 2
+    for request in ("first", "second"):
+        service.main_model._next_response = FakeResponse(f"RETURN '{request}'")
+        service.generate_cypher_query(request)
+
+    service.generate_cypher_query("first")  # refresh "first" so "second" is now the oldest
+    service.main_model._next_response = FakeResponse("RETURN 'third'")
+    service.generate_cypher_query("third")
+
+    assert [request for request, _ in service._query_cache] == ["first", "third"]
+
+
+def test_worker_model_falls_back_to_main_when_no_fast_model(stub_genai, monkeypatch):
+    class MainOnlyModel(stub_genai):
+        def __init__(self, name: str):
+            if "flash" in name:
+                raise ValueError(f"{name} unavailable")
+            super().__init__(name)
+
+    monkeypatch.setattr("graphbot.services.gemini_service.genai.GenerativeModel", MainOnlyModel)
+
+    service = GeminiService()
+
+    assert service.main_model_name == "gemini-3-pro-preview"
+    assert service.worker_model is service.main_model
+    assert service.worker_model_name == "gemini-3-pro-preview"
+
+
+def test_explain_results_batch_preserves_order_and_bounds_concurrency(stub_genai):
+    service = GeminiService()
+    in_flight = 0
+    peak = 0
+
+    async def fake_generate(prompt: str):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0)
+        in_flight -= 1
+        return FakeResponse(prompt.split("Original user request: ")[1].split("\n")[0])
+
+    service.worker_model.generate_content_async = fake_generate
+    items = [(f"RETURN {i}", [i], f"request {i}") for i in range(6)]
+
+    explanations = asyncio.run(service.explain_results_batch_async(items, max_concurrency=2))
+
+    assert explanations == [f"request {i}" for i in range(6)]
+    assert peak == 2
+
+
+def test_sync_wrappers_reuse_one_background_loop(stub_genai):
+    service = GeminiService()
+    loops = []
+
+    async def fake_generate(prompt: str):
+        loops.append(asyncio.get_running_loop())
+        return FakeResponse("MATCH (n) RETURN n")
+
+    service.main_model.generate_content_async = fake_generate
+    service.worker_model.generate_content_async = fake_generate
+    try:
+        service.generate_cypher_query("first request")
+        service.generate_cypher_query("second request")
+        service.explain_result("MATCH (n) RETURN n", [], "first request")
+        thread = service._loop_thread
+    finally:
+        service.close()
+
+    assert len(loops) == 3
+    assert loops[0] is loops[1] is loops[2]
+    assert loops[0].is_closed()
+    assert not thread.is_alive()
+
+
+def test_query_and_explain_returns_results_before_explanation(stub_genai):
+    service = GeminiService()
+    explanation_started = asyncio.Event()
+    release_explanation = asyncio.Event()
+    responses = iter([FakeResponse("MATCH (n) RETURN count(n) AS total")])
+
+    async def fake_generate(prompt: str):
+        if prompt.startswith("Explain"):
+            explanation_started.set()
+            await release_explanation.wait()
+            return FakeResponse("There are 3 nodes.")
+        return next(responses)
+
+    async def executor(cypher: str):
+        return [{"total": 3}]
+
+    async def run():
+        service.main_model.generate_content_async = fake_generate
+        service.worker_model.generate_content_async = fake_generate
+        cypher, results, explain_task = await service.query_and_explain("count nodes", None, executor)
+        assert not explain_task.done()
+        await explanation_started.wait()
+        release_explanation.set()
+        return cypher, results, await explain_task
+
+    cypher, results, explanation = asyncio.run(run())
+
+    assert cypher == "MATCH (n) RETURN count(n) AS total"
+    assert results == [{"total": 3}]
+    assert explanation == "There are 3 nodes."
+
+
+def test_fused_generation_returns_query_and_explanation_template(stub_genai):
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse(
+        "CYPHER:\n```cypher\nMATCH (u:User) RETURN u.name\n```\n---\nEXPLANATION:\nFound {count} users."
+    )
+
+    async def run():
+        first = await service.generate_cypher_and_explanation_async("list users")
+        second = await service.generate_cypher_and_explanation_async("list users?")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first == second == ("MATCH (u:User) RETURN u.name", "Found {count} users.")
+    assert len(service.main_model.prompts) == 1
+    assert service.fill_explanation(first[1], [{}, {}]) == "Found 2 users."
+    assert service.generate_cypher_query("list users") == "MATCH (u:User) RETURN u.name"
+
+
+@pytest.mark.parametrize("reply", [
+    "CYPHER:\nMATCH (n) RETURN n\n\nEXPLANATION:\nFound {count} nodes.",
+    "```\nCYPHER:\nMATCH (n) RETURN n\n---\nEXPLANATION:\nFound {count} nodes.\n```",
+])
+def test_fused_generation_tolerates_missing_separator_and_outer_fence(stub_genai, reply):
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse(reply)
+
+    result = asyncio.run(service.generate_cypher_and_explanation_async("show nodes"))
+
+    assert result == ("MATCH (n) RETURN n", "Found {count} nodes.")
+    assert service.generate_cypher_query("show nodes") == "MATCH (n) RETURN n"
+
+
+def test_fused_generation_regenerates_instead_of_caching_mangled_reply(stub_genai):
+    service = GeminiService()
+    replies = deque([
+        FakeResponse("CYPHER: MATCH (n) RETURN n EXPLANATION: Found {count} nodes."),
+        FakeResponse("MATCH (n) RETURN n LIMIT 25"),
+    ])
+    prompts = []
+
+    async def generate(prompt: str, **kwargs):
+        prompts.append(prompt)
+        return replies.popleft()
+
+    service.main_model.generate_content_async = generate
+
+    result = asyncio.run(service.generate_cypher_and_explanation_async("show nodes"))
+
+    assert result == ("MATCH (n) RETURN n LIMIT 25", None)
+    assert len(prompts) == 2 and "EXPLANATION:" not in prompts[1]
+    assert service.generate_cypher_query("show nodes") == "MATCH (n) RETURN n LIMIT 25"
+
+
+def test_fused_query_and_explain_skips_worker_and_falls_back_on_bad_format(stub_genai):
+    service = GeminiService()
+
+    async def executor(cypher: str):
+        return [{"n": 1}, {"n": 2}, {"n": 3}]
+
+    async def run(reply: str, request: str):
+        service.main_model._next_response = FakeResponse(reply)
+        cypher, _, explain_task = await service.query_and_explain(request, None, executor, fused=True)
+        return cypher, await explain_task
+
+    fused = asyncio.run(run("CYPHER: MATCH (n) RETURN count(n)\n---\nEXPLANATION: {count} total.", "count"))
+    assert fused == ("MATCH (n) RETURN count(n)", "3 total.")
+    assert service.worker_model.prompts == []
+
+    fallback = asyncio.run(run("MATCH (n) RETURN n LIMIT 25", "show nodes"))
+    assert fallback == ("MATCH (n) RETURN n LIMIT 25", "DEFAULT")
+    assert service.worker_model.prompts[-1][0].startswith("Explain")
+
+
+def test_stream_cypher_query_yields_chunks_then_caches_clean_query(stub_genai):
+    service = GeminiService()
+    chunks = ["```cypher\nMATCH (n)", " RETURN n", "\n```"]
+    calls = []
+
+    async def fake_stream(prompt: str, **kwargs):
+        calls.append(kwargs)
+
+        async def iterate():
+            for text in chunks:
+                await asyncio.sleep(0)
+                yield FakeResponse(text)
+
+        return iterate()
+
+    service.main_model.generate_content_async = fake_stream
+
+    async def collect(request: str):
+        return [piece async for piece in service.stream_cypher_query_async(request)]
+
+    assert asyncio.run(collect("show nodes")) == chunks
+    assert calls == [{"stream": True}]
+    assert asyncio.run(collect("show nodes?")) == ["MATCH (n) RETURN n"]
+    assert service.generate_cypher_query("show nodes") == "MATCH (n) RETURN n"
+    assert len(calls) == 1
+
+
+def test_stream_cypher_query_falls_back_when_stream_fails_before_output(stub_genai):
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse("MATCH (n) RETURN n LIMIT 25")
+    fallback_call = service.main_model.generate_content_async
+
+    async def flaky(prompt: str, **kwargs):
+        if kwargs.get("stream"):
+            raise RuntimeError("503 stream unavailable")
+        return await fallback_call(prompt, **kwargs)
+
+    service.main_model.generate_content_async = flaky
+
+    async def collect():
+        return [piece async for piece in service.stream_cypher_query_async("show nodes")]
+
+    assert asyncio.run(collect()) == ["MATCH (n) RETURN n LIMIT 25"]
+
+
+def test_stream_cypher_query_falls_back_when_stream_yields_no_text(stub_genai):
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse("MATCH (n) RETURN n LIMIT 25")
+    fallback_call = service.main_model.generate_content_async
+
+    class MetadataOnlyChunk:
+        @property
+        def text(self):
+            raise ValueError("chunk has no text")
+
+        parts = []
+
+    async def empty_stream(prompt: str, **kwargs):
+        if not kwargs.get("stream"):
+            return await fallback_call(prompt, **kwargs)
+
+        async def iterate():
+            yield MetadataOnlyChunk()
+
+        return iterate()
+
+    service.main_model.generate_content_async = empty_stream
+
+    async def collect():
+        return [piece async for piece in service.stream_cypher_query_async("show nodes")]
+
+    assert asyncio.run(collect()) == ["MATCH (n) RETURN n LIMIT 25"]
+    assert service.generate_cypher_query("show nodes") == "MATCH (n) RETURN n LIMIT 25"
+    assert "" not in service._query_cache.values()
+
+
+def test_explain_result_uses_worker_and_fails_over_without_touching_main(stub_genai):
+    service = GeminiService()
+    service.available_models["gemini-2.0-flash"] = "models/gemini-2.0-flash"
+    main_model = service.main_model
+
+    async def rate_limited(prompt: str):
+        raise RuntimeError("429 Resource exhausted")
+
+    service.worker_model.generate_content_async = rate_limited
+
+    explanation = asyncio.run(service.explain_result_async("MATCH (n) RETURN n", [], "show nodes"))
+
+    assert explanation == "DEFAULT"
+    assert service.worker_model_name == "gemini-2.0-flash"
+    assert service.main_model is main_model
+    assert service.main_model_name == "gemini-3-pro-preview"
+    assert main_model.last_prompt is None
+
+
+def test_model_catalog_is_cached_on_disk(stub_genai, monkeypatch):
+    monkeypatch.delenv("WORKER_MODEL")
+    first = GeminiService()
+    assert os.path.exists(first._model_catalog_file)
+
+    def offline_list_models():
+        raise AssertionError("list_models should not be called while the catalog is fresh")
+
+    monkeypatch.setattr("graphbot.services.gemini_service.genai.list_models", offline_list_models)
+    second = GeminiService()
+
+    assert second.available_models == first.available_models
+    assert second.available_models["gemini-3-pro-preview"] == "models/gemini-3-pro-preview"
+
+
+def test_stale_model_catalog_is_refreshed(stub_genai, monkeypatch):
+    monkeypatch.delenv("WORKER_MODEL")
+    service = GeminiService()
+    stale = os.path.getmtime(service._model_catalog_file) - 2 * 24 * 3600
+    os.utime(service._model_catalog_file, (stale, stale))
+    calls = []
+
+    def counting_list_models():
+        calls.append(1)
+        return [FakeModelInfo("gemini-3-pro-preview")]
+
+    monkeypatch.setattr("graphbot.services.gemini_service.genai.list_models", counting_list_models)
+    refreshed = GeminiService()
+
+    assert calls == [1]
+    assert list(refreshed.available_models) == ["gemini-3-pro-preview"]
+
+
+def test_repeated_model_not_found_errors_refresh_the_catalog(stub_genai, monkeypatch):
+    calls = []
+
+    def counting_list_models():
+        calls.append(threading.current_thread().name)
+        return [FakeModelInfo("gemini-3-pro-preview")]
+
+    async def missing_model(prompt: str, **kwargs):
+        raise RuntimeError("404 models/gemini-3-pro-preview is not found")
+
+    monkeypatch.setattr("graphbot.services.gemini_service.genai.list_models", counting_list_models)
+    service = GeminiService()
+    service.main_model.generate_content_async = missing_model
+
+    for request in ("first request", "second request"):
+        with pytest.raises(Exception, match="Model not found"):
+            service.generate_cypher_query(request)
+
+    # Startup load, then one refresh in a worker thread rather than on the sync-wrapper loop
+    assert len(calls) == 2
+    assert calls[1] not in (threading.main_thread().name, "gemini-sync-loop")
+    assert service._model_not_found_count == 0
+    assert os.path.exists(service._model_catalog_file)
+
+    service.invalidate_model_catalog()
+    assert not os.path.exists(service._model_catalog_file)
+    assert service.available_models == {}
+
+
+def test_pinned_models_skip_catalog_until_fallback(stub_genai, monkeypatch):
+    calls = []
+
+    def counting_list_models():
+        calls.append(1)
+        return [FakeModelInfo("gemini-3-pro-preview"), FakeModelInfo("gemini-2.0-flash")]
+
+    monkeypatch.setattr("graphbot.services.gemini_service.genai.list_models", counting_list_models)
+    service = GeminiService()
+
+    assert calls == []
+    assert service.main_model_name == "gemini-3-pro-preview"
+    assert service.worker_model_name == "gemini-1.5-flash"
+
+    assert service._try_fallback_model()
+    assert service.main_model_name == "gemini-2.0-flash"
+    assert not service._try_fallback_model()
+    assert calls == [1]
+
+
+def test_async_fallback_loads_catalog_off_the_event_loop(stub_genai, monkeypatch):
+    threads = []
+
+    def recording_list_models():
+        threads.append(threading.current_thread())
+        return [FakeModelInfo("gemini-3-pro-preview"), FakeModelInfo("gemini-2.0-flash")]
+
+    monkeypatch.setattr("graphbot.services.gemini_service.genai.list_models", recording_list_models)
+    service = GeminiService()
+
+    assert asyncio.run(service._try_fallback_model_async())
+    assert service.main_model_name == "gemini-2.0-flash"
+    assert len(threads) == 1
+    assert threads[0] is not threading.main_thread()
+
+
+def test_first_cypher_request_warms_worker_once(stub_genai):
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse("MATCH (n) RETURN n")
+
+    async def run():
+        await service.generate_cypher_query_async("first request")
+        await service._warmup_task
+        await service.generate_cypher_query_async("second request")
+
+    asyncio.run(run())
+
+    assert service.worker_model.prompts == [("ok", {"generation_config": {"max_output_tokens": 1}})]
+
+
+def test_try_fallback_model_advances_past_current_model(stub_genai):
+    service = GeminiService()
+    service.available_models.update({
+        "gemini-2.0-flash": "models/gemini-2.0-flash",
+        "gemini-2.0-pro-exp": "models/gemini-2.0-pro-exp",
+    })
+
+    assert service._try_fallback_model()
+    assert service.main_model_name == "gemini-2.0-flash"
+    assert service._try_fallback_model()
+    assert service.main_model_name == "gemini-2.0-pro-exp"
+    assert not service._try_fallback_model()
+    assert service.main_model_name == "gemini-2.0-pro-exp"
+
+
+def test_async_fallback_probes_concurrently_and_takes_first_live_model(stub_genai, monkeypatch):
+    probed = []
+
+    class ProbedModel(stub_genai):
+        async def generate_content_async(self, prompt: str, **kwargs):
+            probed.append(self.name)
+            if self.name == "models/gemini-2.0-flash":
+                raise RuntimeError("429 Resource exhausted")
+            if self.name == "models/gemini-2.0-flash-exp":
+                await asyncio.sleep(10)
+            return self.generate_content(prompt, **kwargs)
+
+    service = GeminiService()
+    service.available_models.update({
+        name: f"models/{name}" for name in ("gemini-2.0-flash", "gemini-2.0-flash-exp", "gemini-2.0-pro-exp")
+    })
+    monkeypatch.setattr("graphbot.services.gemini_service.genai.GenerativeModel", ProbedModel)
+
+    switched = asyncio.run(asyncio.wait_for(service._try_fallback_model_async(), timeout=5))
+
+    assert switched
+    assert service.main_model_name == "gemini-2.0-pro-exp"
+    assert sorted(probed) == [
+        "models/gemini-2.0-flash", "models/gemini-2.0-flash-exp", "models/gemini-2.0-pro-exp"
+    ]
+
+
+def test_concurrent_identical_requests_share_one_call(stub_genai):
+    service = GeminiService()
+    calls = []
+
+    async def slow_generate(prompt: str, **kwargs):
+        calls.append(prompt)
+        await asyncio.sleep(0.01)
+        return FakeResponse("MATCH (u:User) RETURN u")
+
+    service.main_model.generate_content_async = slow_generate
+
+    async def run():
+        return await asyncio.gather(
+            service.generate_cypher_query_async("List all users"),
+            service.generate_cypher_query_async("List all users?"),
+            service.generate_cypher_query_async("List all users"),
+        )
+
+    results = asyncio.run(run())
+
+    assert results == ["MATCH (u:User) RETURN u"] * 3
+    assert len(calls) == 1
+    assert service._inflight == {}
+
+
+def test_concurrent_identical_requests_share_failure(stub_genai):
+    service = GeminiService()
+
+    async def invalid_key(prompt: str, **kwargs):
+        await asyncio.sleep(0)
+        raise RuntimeError("400 API_KEY_INVALID")
+
+    service.main_model.generate_content_async = invalid_key
+
+    async def run():
+        return await asyncio.gather(
+            service.generate_cypher_query_async("List all users"),
+            service.generate_cypher_query_async("List all users"),
+            return_exceptions=True,
+        )
+
+    results = asyncio.run(run())
+
+    assert all(isinstance(r, Exception) and "Invalid API Key" in str(r) for r in results)
+    assert service._inflight == {}
+
+
+def test_env_files_load_once_on_first_construction(stub_genai, monkeypatch):
+    calls = []
+    monkeypatch.setattr(GeminiService, "_env_loaded", False)
+    monkeypatch.setattr("graphbot.services.gemini_service.load_dotenv", lambda *args: calls.append(args))
+    monkeypatch.setenv("CONFIG_FILE", "does-not-exist.env")
+
+    GeminiService()
+    GeminiService()
+
+    assert calls == [()]
+
+
+def test_query_store_is_off_by_default(stub_genai, tmp_path):
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse("MATCH (u:User) RETURN u")
+    service.generate_cypher_query("List all users")
+
+    assert service._query_store is None
+    assert not (tmp_path / "cache" / "queries.db").exists()
+
+
+def test_generated_queries_persist_across_instances(stub_genai, monkeypatch):
+    monkeypatch.setenv("GRAPHBOT_QUERY_STORE", "1")
+    first = GeminiService()
+    first.main_model._next_response = FakeResponse("MATCH (u:User) RETURN u")
+    first.generate_cypher_query("List all users", context="(:User)")
+    first.close()
+
+    second = GeminiService()
+    second.main_model._next_response = FakeResponse("SHOULD NOT BE USED")
+    try:
+        assert second.generate_cypher_query("List all users", context="(:User)") == "MATCH (u:User) RETURN u"
+        assert second.main_model.last_prompt is None
+        assert second.generate_cypher_query("List all users", context="(:Customer)") == "SHOULD NOT BE USED"
+    finally:
+        second.close()
+
+
+def test_stored_queries_are_scoped_by_model(stub_genai, monkeypatch):
+    monkeypatch.setenv("GRAPHBOT_QUERY_STORE", "1")
+    first = GeminiService()
+    first.main_model._next_response = FakeResponse("MATCH (u:User) RETURN u")
+    first.generate_cypher_query("List all users")
+    first.close()
+
+    monkeypatch.setenv("MAIN_MODEL", "gemini-2.5-pro")
+    second = GeminiService()
+    second.main_model._next_response = FakeResponse("MATCH (u:User) RETURN u.name")
+
+    assert second.generate_cypher_query("List all users") == "MATCH (u:User) RETURN u.name"
+
+
+def test_query_store_ignores_expired_entries(tmp_path):
+    from graphbot.services.gemini_service import QueryStore
+
+    store = QueryStore(str(tmp_path / "queries.db"), ttl=60)
+    store.put(("list users", None), "MATCH (u:User) RETURN u")
+    assert store.get(("list users", None)) == "MATCH (u:User) RETURN u"
+
+    store.ttl = -1
+    assert store.get(("list users", None)) is None
+    store.close()
+    assert store.get(("list users", None)) is None
+
+
+def test_extract_text_falls_back_to_parts(stub_genai):
+    service = GeminiService()
+
+    class PartsOnlyResponse:
+        @property
+        def text(self):
+            raise ValueError("response.text requires a single candidate")
+
+        parts = [types.SimpleNamespace(text="MATCH (n) "), "RETURN n", {"text": " LIMIT 5"}, {"other": 1}]
+
+    assert service._extract_text(FakeResponse("RETURN 1")) == "RETURN 1"
+    assert service._extract_text(PartsOnlyResponse()) == "MATCH (n) RETURN n LIMIT 5"
+    assert service._extract_text_from_parts([types.SimpleNamespace(text="only")]) == "only"
+
+    candidate = types.SimpleNamespace(content=types.SimpleNamespace(parts=[{"text": "RETURN 2"}]))
+    assert service._extract_text(types.SimpleNamespace(parts=[], candidates=[candidate])) == "RETURN 2"
+    with pytest.raises(ValueError, match="candidates=0"):
+        service._extract_text(types.SimpleNamespace(candidates=[]))
+
+
+def test_quiet_mode_suppresses_per_request_output(stub_genai, monkeypatch, capsys):
+    monkeypatch.setenv("GRAPHBOT_QUIET", "1")
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse("MATCH (n) RETURN n")
+    capsys.readouterr()
+
+    service.generate_cypher_query("Find all nodes")
+    service.generate_cypher_query("Find all nodes")
+
+    assert capsys.readouterr().out == ""
+
+
+def test_semantic_cache_reuses_query_for_paraphrase(stub_genai, monkeypatch):
+    monkeypatch.setenv("GRAPHBOT_SEMANTIC_CACHE", "1")
+    vectors = {
+        "List all users": [1.0, 0.0, 0.1],
+        "Show me every user": [0.98, 0.0, 0.12],
+        "Count the orders": [0.0, 1.0, 0.0],
+    }
+
+    async def fake_embed(model, content, task_type=None):
+        return {"embedding": vectors[content]}
+
+    monkeypatch.setattr("graphbot.services.gemini_service.genai.embed_content_async", fake_embed)
+    service = GeminiService()
+    service.main_model._next_response = FakeResponse("MATCH (u:User) RETURN u")
+    service.generate_cypher_query("List all users")
+
+    service.main_model._next_response = FakeResponse("MATCH (o:Order) RETURN count(o)")
+    assert service.generate_cypher_query("Show me every user") == "MATCH (u:User) RETURN u"
+    assert service.generate_cypher_query("Count the orders") == "MATCH (o:Order) RETURN count(o)"
+    assert service.generate_cypher_query("Show me every user", context="(:Customer)") == "MATCH (o:Order) RETURN count(o)"
+
+
+def test_close_cancels_pending_tasks_on_sync_loop(stub_genai):
+    service = GeminiService()
+    service.generate_cypher_query("warm up the loop")
+    loop = service._loop
+
+    async def start_sleeper():
+        return asyncio.get_running_loop().create_task(asyncio.sleep(60))
+
+    sleeper = asyncio.run_coroutine_threadsafe(start_sleeper(), loop).result()
+    service.close()
+
+    assert sleeper.cancelled()
+    assert loop.is_closed()
+    assert service._loop is None
+
@@ -1,14 +1,15 @@
 import asyncio
 import types
+from collections import deque
 import pytest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock, MagicMock
 
 from graphbot.services.insight_agent import InsightAgent
 
 
 class AsyncIterator:
     def __init__(self, items):
-        self.items = items
+        self.items = deque(items)
 
     def __aiter__(self):
         return self
@@ -16,7 +17,7 @@ class AsyncIterator:
     async def __anext__(self):
         if not self.items:
             raise StopAsyncIteration
-        return self.items.pop(0)
+        return self.items.popleft()
 
 
 class DummyGemini:
@@ -29,12 +30,12 @@ class DummyGemini:
 
 class StubWorker:
     def __init__(self, responses):
-        self.responses = list(responses)
+        self.responses = deque(responses)
         self.prompts = []
 
     async def generate_content_async(self, prompt: str):
         self.prompts.append(prompt)
-        text = self.responses.pop(0)
+        text = self.responses.popleft()
         return types.SimpleNamespace(text=text)
 
 
@@ -48,6 +49,18 @@ def test_generate_summary_uses_worker_model():
     assert "Schema text here" in worker.prompts[0]
 
 
+def test_names_only_summary_prompt_skips_volume_stats():
+    worker = StubWorker(["Full summary.", "Names summary."])
+    agent = InsightAgent(DummyGemini(worker))
+
+    asyncio.run(agent._generate_summary_async("- **Person**: 2 nodes."))
+    asyncio.run(agent._generate_summary_async("- **Person**", names_only=True))
+
+    assert "data volume stats" in worker.prompts[0]
+    assert "data volume stats" not in worker.prompts[1]
+    assert "without counts" in worker.prompts[1]
+
+
 def test_suggest_questions_trims_and_limits():
     worker = StubWorker(
         [
@@ -61,6 +74,269 @@ def test_suggest_questions_trims_and_limits():
     assert questions == ["Question one", "Question two", "Question three"]
 
 
+@pytest.mark.asyncio
+async def test_summary_retries_rate_limits_with_jittered_backoff(monkeypatch):
+    """Test that a 429 is retried after a randomized delay."""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr("graphbot.services.insight_agent.asyncio.sleep", fake_sleep)
+    monkeypatch.setattr("graphbot.services.insight_agent.random.random", lambda: 0.5)
+    worker = MagicMock()
+    worker.generate_content_async = AsyncMock(
+        side_effect=[Exception("429 Resource exhausted"), types.SimpleNamespace(text="A summary.")]
+    )
+    agent = InsightAgent(DummyGemini(worker))
+
+    assert await agent._generate_summary_async("schema") == "A summary."
+    assert delays == [0.5]
+
+
+@pytest.mark.asyncio
+async def test_analyze_database_overlaps_summary_and_questions(monkeypatch, tmp_path):
+    """Test that the summary and question prompts are in flight together."""
+    from graphbot.services.cache_manager import CacheManager
+
+    cache = CacheManager(cache_file=str(tmp_path / "cache.json"))
+    monkeypatch.setattr("graphbot.services.insight_agent.get_cache_manager", lambda: cache)
+    both_started = asyncio.Event()
+    prompts = []
+
+    class OverlapWorker:
+        async def generate_content_async(self, prompt: str):
+            prompts.append(prompt)
+            if len(prompts) == 2:
+                both_started.set()
+            await asyncio.wait_for(both_started.wait(), timeout=1)
+            if "suggest 3" in prompt:
+                return types.SimpleNamespace(text="Who knows whom?")
+            return types.SimpleNamespace(text="A social graph.")
+
+    agent = InsightAgent(DummyGemini(OverlapWorker()))
+
+    async def fake_schema(neo4j):
+        return "## Node Labels\n- **Person**: 2 nodes."
+
+    async def no_names(neo4j):
+        return None
+
+    monkeypatch.setattr(agent, "_extract_raw_schema_async", fake_schema)
+    monkeypatch.setattr(agent, "_fetch_schema_names_async", no_names)
+    mock_neo4j = MagicMock(uri="bolt://localhost:7687", database="neo4j")
+
+    try:
+        result = await agent.analyze_database_async(mock_neo4j)
+    finally:
+        cache.close()
+
+    assert result["summary"] == "A social graph."
+    assert result["suggested_questions"] == ["Who knows whom?"]
+    assert all("**Person**: 2 nodes" in prompt for prompt in prompts)
+
+
+@pytest.mark.asyncio
+async def test_analyze_database_starts_summary_before_counts_finish(monkeypatch, tmp_path):
+    """Test that the summary is generated from schema names while the count queries still run."""
+    from graphbot.services.cache_manager import CacheManager
+
+    cache = CacheManager(cache_file=str(tmp_path / "cache.json"))
+    monkeypatch.setattr("graphbot.services.insight_agent.get_cache_manager", lambda: cache)
+    summary_started = asyncio.Event()
+    worker = StubWorker(["A social graph.", "Who knows whom?"])
+    original_generate = worker.generate_content_async
+
+    async def tracking_generate(prompt: str):
+        summary_started.set()
+        return await original_generate(prompt)
+
+    worker.generate_content_async = tracking_generate
+    agent = InsightAgent(DummyGemini(worker))
+    mock_neo4j = MagicMock(uri="bolt://localhost:7687", database="neo4j")
+    mock_session = MagicMock()
+    mock_neo4j.driver.session.return_value.__aenter__.return_value = mock_session
+
+    async def mock_run(query):
+        if "collect(relationshipType)" in query:
+            names = types.SimpleNamespace()
+            async def single():
+                return {"labels": ["Person"], "types": ["KNOWS"]}
+            names.single = single
+            return names
+        # Count scans only finish once the summary request is already out
+        await asyncio.wait_for(summary_started.wait(), timeout=1)
+        if "CALL db.labels" in query:
+            return AsyncIterator([{"label": "Person", "count": 2}])
+        if "sampleKeys" in query:
+            return AsyncIterator([{"idx": 0, "sampleKeys": ["name"]}])
+        return AsyncIterator([{"relationshipType": "KNOWS", "count": 1}])
+
+    mock_session.run = mock_run
+
+    try:
+        result = await agent.analyze_database_async(mock_neo4j)
+    finally:
+        cache.close()
+
+    assert result["summary"] == "A social graph."
+    assert result["suggested_questions"] == ["Who knows whom?"]
+    assert "- **Person**\n" in worker.prompts[0] and "nodes" not in worker.prompts[0]
+    # Counts are not known yet, so the early summary must not be asked for volume stats
+    assert "data volume stats" not in worker.prompts[0]
+    assert "- **Person**: 2 nodes." in worker.prompts[1]
+
+
+@pytest.mark.asyncio
+async def test_analyze_database_cache_follows_schema_fingerprint(monkeypatch, tmp_path):
+    """Test that cached insights are reused for an unchanged schema and recomputed after a change."""
+    from graphbot.services.cache_manager import CacheManager, create_cache_key
+
+    cache = CacheManager(cache_file=str(tmp_path / "cache.json"))
+    monkeypatch.setattr("graphbot.services.insight_agent.get_cache_manager", lambda: cache)
+    worker = StubWorker(["Summary 1", "Q1", "Summary 2", "Q2", "Summary 3", "Q3"])
+    agent = InsightAgent(DummyGemini(worker))
+    names = (["Person"], ["KNOWS"])
+
+    async def fake_names(neo4j):
+        return names
+
+    async def fake_schema(neo4j):
+        return "## Node Labels\n- **Person**: 2 nodes."
+
+    monkeypatch.setattr(agent, "_fetch_schema_names_async", fake_names)
+    monkeypatch.setattr(agent, "_extract_raw_schema_async", fake_schema)
+    mock_neo4j = MagicMock(uri="bolt://localhost:7687", database="neo4j")
+
+    try:
+        # Entries written before fingerprinting are not trusted
+        cache.put(create_cache_key(mock_neo4j.uri, mock_neo4j.database, "insights"), {"summary": "old"})
+        first = await agent.analyze_database_async(mock_neo4j)
+        again = await agent.analyze_database_async(mock_neo4j)
+        names = (["Movie", "Person"], ["KNOWS"])
+        changed = await agent.analyze_database_async(mock_neo4j)
+        assert agent.invalidate_cache(mock_neo4j)
+        refreshed = await agent.analyze_database_async(mock_neo4j)
+    finally:
+        cache.close()
+
+    assert first["summary"] == again["summary"] == "Summary 1"
+    assert changed["summary"] == "Summary 2"
+    assert refreshed["summary"] == "Summary 3"
+    assert len(worker.prompts) == 6
+
+
+@pytest.mark.asyncio
+async def test_analyze_database_reuses_insights_for_near_identical_schema(monkeypatch, tmp_path):
+    """Test that a slightly grown schema keeps its insights and only re-extracts the schema text."""
+    from graphbot.services.cache_manager import CacheManager
+
+    cache = CacheManager(cache_file=str(tmp_path / "cache.json"))
+    monkeypatch.setattr("graphbot.services.insight_agent.get_cache_manager", lambda: cache)
+    worker = StubWorker(["Summary 1", "Q1", "Summary 2", "Q2"])
+    agent = InsightAgent(DummyGemini(worker))
+    labels = [f"Label{i}" for i in range(30)]
+    names = (labels, ["KNOWS"])
+    extractions = []
+
+    async def fake_names(neo4j):
+        return names
+
+    async def fake_schema(neo4j):
+        extractions.append(names)
+        return "\n".join(f"- **{label}**: 1 nodes." for label in names[0])
+
+    monkeypatch.setattr(agent, "_fetch_schema_names_async", fake_names)
+    monkeypatch.setattr(agent, "_extract_raw_schema_async", fake_schema)
+    mock_neo4j = MagicMock(uri="bolt://localhost:7687", database="neo4j")
+
+    try:
+        await agent.analyze_database_async(mock_neo4j)
+        names = (labels + ["Extra1"], ["KNOWS"])
+        drifted = await agent.analyze_database_async(mock_neo4j)
+        # Drift is measured from the schema the insights were written for
+        names = (labels + ["Extra1", "Extra2"], ["KNOWS"])
+        regenerated = await agent.analyze_database_async(mock_neo4j)
+    finally:
+        cache.close()
+
+    assert drifted["summary"] == "Summary 1" and drifted["suggested_questions"] == ["Q1"]
+    assert "- **Extra1**" in drifted["raw_schema"]
+    assert regenerated["summary"] == "Summary 2"
+    assert len(extractions) == 3
+    assert len(worker.prompts) == 4
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("raw_schema, summary", [
+    ("## Node Labels\n\n## Relationships", "The database is empty."),
+    ("Error extracting schema: connection refused", "Database summary unavailable."),
+])
+async def test_analyze_database_skips_llm_for_empty_schema(monkeypatch, tmp_path, raw_schema, summary):
+    """Test that an empty or failed schema extraction returns canned insights without LLM calls."""
+    from graphbot.services.cache_manager import CacheManager
+
+    cache = CacheManager(cache_file=str(tmp_path / "cache.json"))
+    monkeypatch.setattr("graphbot.services.insight_agent.get_cache_manager", lambda: cache)
+    worker = StubWorker([])
+    agent = InsightAgent(DummyGemini(worker))
+
+    async def fake_names(neo4j):
+        return [], []
+
+    async def fake_schema(neo4j):
+        return raw_schema
+
+    monkeypatch.setattr(agent, "_fetch_schema_names_async", fake_names)
+    monkeypatch.setattr(agent, "_extract_raw_schema_async", fake_schema)
+
+    try:
+        result = await agent.analyze_database_async(MagicMock(uri="bolt://localhost:7687", database="neo4j"))
+    finally:
+        cache.close()
+
+    assert result == {"raw_schema": raw_schema, "summary": summary, "suggested_questions": []}
+    assert worker.prompts == []
+
+
+@pytest.mark.asyncio
+async def test_analyze_database_coalesces_concurrent_calls(monkeypatch, tmp_path):
+    """Test that concurrent analyses of the same database share a single run."""
+    from graphbot.services.cache_manager import CacheManager
+
+    cache = CacheManager(cache_file=str(tmp_path / "cache.json"))
+    monkeypatch.setattr("graphbot.services.insight_agent.get_cache_manager", lambda: cache)
+    worker = StubWorker(["A summary.", "Q1"])
+    agent = InsightAgent(DummyGemini(worker))
+    extractions = []
+
+    async def fake_names(neo4j):
+        return None
+
+    async def fake_schema(neo4j):
+        extractions.append(neo4j)
+        await asyncio.sleep(0.01)
+        return "- **Person**: 2 nodes."
+
+    monkeypatch.setattr(agent, "_fetch_schema_names_async", fake_names)
+    monkeypatch.setattr(agent, "_extract_raw_schema_async", fake_schema)
+    mock_neo4j = MagicMock(uri="bolt://localhost:7687", database="neo4j")
+
+    try:
+        first, second = await asyncio.gather(
+            agent.analyze_database_async(mock_neo4j),
+            agent.analyze_database_async(mock_neo4j),
+        )
+    finally:
+        cache.close()
+
+    assert first == second
+    assert first["summary"] == "A summary."
+    assert len(extractions) == 1
+    assert len(worker.prompts) == 2
+    assert agent._inflight == {}
+
+
 def test_analyze_database_no_driver():
     """Test analyze_database when no driver is available."""
     mock_service = MagicMock()
@@ -74,28 +350,30 @@ def test_analyze_database_no_driver():
     assert result["raw_schema"] == "Schema unavailable"
 
 
-def test_generate_summary_error_handling():
+@pytest.mark.asyncio
+async def test_generate_summary_error_handling():
     """Test summary generation error handling."""
     mock_service = MagicMock()
     agent = InsightAgent(mock_service)
 
     # Mock worker model to raise exception
-    agent.worker_model.generate_content.side_effect = Exception("API Error")
+    agent.worker_model.generate_content_async = AsyncMock(side_effect=Exception("API Error"))
 
-    summary = agent._generate_summary("Some schema")
+    summary = await agent._generate_summary_async("Some schema")
 
-    assert summary.startswith("Summary generation failed")
+    assert summary == "Database summary unavailable."
 
 
-def test_suggest_questions_error_handling():
+@pytest.mark.asyncio
+async def test_suggest_questions_error_handling():
     """Test question suggestion error handling."""
     mock_service = MagicMock()
     agent = InsightAgent(mock_service)
 
     # Mock worker model to raise exception
-    agent.worker_model.generate_content.side_effect = Exception("API Error")
+    agent.worker_model.generate_content_async = AsyncMock(side_effect=Exception("API Error"))
 
-    questions = agent._suggest_questions("schema", "summary")
+    questions = await agent._suggest_questions_async("schema", "summary")
 
     assert questions == []
 
@@ -127,6 +405,169 @@ async def test_extract_raw_schema_async_empty_database():
     assert "## Relationships" in schema
 
 
+@pytest.mark.asyncio
+async def test_extract_raw_schema_async_samples_properties_with_label_scans():
+    """Test that non-empty labels are sampled together, one label-scan branch per label."""
+    agent = InsightAgent(MagicMock())
+    mock_neo4j = MagicMock()
+    mock_session = MagicMock()
+    mock_neo4j.driver.session.return_value.__aenter__.return_value = mock_session
+    queries = []
+
+    async def mock_run(query):
+        queries.append(query)
+        if "CALL db.labels" in query:
+            return AsyncIterator([
+                {"label": "Empty", "count": 0},
+                {"label": "Odd`Label", "count": 3},
+                {"label": "Person", "count": 1200},
+            ])
+        if "sampleKeys" in query:
+            return AsyncIterator([
+                {"idx": 0, "sampleKeys": ["id"]},
+                {"idx": 1, "sampleKeys": ["name", "age"]},
+            ])
+        return AsyncIterator([{"relationshipType": "KNOWS", "count": 5}])
+
+    mock_session.run = mock_run
+    agent._concurrent_call_support[mock_neo4j.uri] = False
+    agent._apoc_missing.add(mock_neo4j.uri)
+
+    schema = await agent._extract_raw_schema_async(mock_neo4j)
+
+    sample_query = next(query for query in queries if "sampleKeys" in query)
+    assert len(queries) == 3
+    assert "MATCH (n:`Odd``Label`)" in sample_query and "MATCH (n:`Person`)" in sample_query
+    assert "UNION ALL" in sample_query and "Empty" not in sample_query
+    assert "labels(n)" not in sample_query
+    assert "- **Empty**: 0 nodes." in schema
+    assert "- **Odd`Label**: 3 nodes. Properties: id" in schema
+    assert "- **Person**: 1,200 nodes. Properties: name, age" in schema
+    assert "- **KNOWS**: 5 connections." in schema
+
+
+@pytest.mark.asyncio
+async def test_extract_raw_schema_async_runs_branches_in_separate_sessions():
+    """Test that label and relationship queries overlap and fail independently."""
+    agent = InsightAgent(MagicMock())
+    mock_neo4j = MagicMock()
+    mock_session = MagicMock()
+    mock_neo4j.driver.session.return_value.__aenter__.return_value = mock_session
+    both_started = asyncio.Event()
+    started = []
+
+    async def mock_run(query):
+        started.append(query)
+        if len(started) == 2:
+            both_started.set()
+        await asyncio.wait_for(both_started.wait(), timeout=1)
+        if "CALL db.labels" in query:
+            raise Exception("labels unavailable")
+        return AsyncIterator([{"relationshipType": "KNOWS", "count": 5}])
+
+    mock_session.run = mock_run
+    agent._concurrent_call_support[mock_neo4j.uri] = False
+    agent._apoc_missing.add(mock_neo4j.uri)
+
+    schema = await agent._extract_raw_schema_async(mock_neo4j)
+
+    assert mock_neo4j.driver.session.call_count == 2
+    assert "- Error fetching labels: labels unavailable" in schema
+    assert "- **KNOWS**: 5 connections." in schema
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("version, concurrent", [("5.26.1-aura", True), ("2025.01.0", True), ("5.20.0", False)])
+async def test_extract_raw_schema_async_uses_concurrent_calls_on_new_servers(version, concurrent):
+    """Test that count subqueries run IN CONCURRENT TRANSACTIONS only where supported, detected once."""
+    agent = InsightAgent(MagicMock())
+    mock_neo4j = MagicMock()
+    mock_session = MagicMock()
+    mock_neo4j.driver.session.return_value.__aenter__.return_value = mock_session
+    queries = []
+
+    async def mock_run(query):
+        queries.append(query)
+        if "dbms.components" in query:
+            components = types.SimpleNamespace()
+            async def single():
+                return {"version": version}
+            components.single = single
+            return components
+        return AsyncIterator([])
+
+    mock_session.run = mock_run
+
+    await agent._extract_raw_schema_async(mock_neo4j)
+    await agent._extract_raw_schema_async(mock_neo4j)
+
+    assert sum("dbms.components" in query for query in queries) == 1
+    count_queries = [query for query in queries if "count(" in query]
+    assert len(count_queries) == 4
+    assert all(("IN CONCURRENT TRANSACTIONS OF 16 ROWS" in query) == concurrent for query in count_queries)
+
+
+@pytest.mark.asyncio
+async def test_extract_raw_schema_async_prefers_apoc_counters():
+    """Test that apoc.meta.stats replaces the count scans, with one batched property sample."""
+    agent = InsightAgent(MagicMock())
+    mock_neo4j = MagicMock()
+    mock_session = MagicMock()
+    mock_neo4j.driver.session.return_value.__aenter__.return_value = mock_session
+    calls = []
+
+    async def mock_run(query, **params):
+        calls.append((query, params))
+        if "apoc.meta.stats" in query:
+            stats = types.SimpleNamespace()
+            async def single():
+                return {"labels": {"Person": 1200, "Empty": 0}, "relTypesCount": {"KNOWS": 5}}
+            stats.single = single
+            return stats
+        return AsyncIterator([{"idx": 0, "sampleKeys": ["name", "age"]}])
+
+    mock_session.run = mock_run
+
+    schema = await agent._extract_raw_schema_async(mock_neo4j)
+
+    assert len(calls) == 2
+    assert "MATCH (n:`Person`)" in calls[1][0] and "labels(n)" not in calls[1][0]
+    assert "Empty" not in calls[1][0]
+    assert schema == (
+        "## Node Labels\n"
+        "- **Empty**: 0 nodes.\n"
+        "- **Person**: 1,200 nodes. Properties: name, age\n"
+        "\n## Relationships\n"
+        "- **KNOWS**: 5 connections."
+    )
+
+
+@pytest.mark.asyncio
+async def test_extract_raw_schema_async_remembers_missing_apoc():
+    """Test that a server without APOC is not asked for apoc.meta.stats again."""
+    agent = InsightAgent(MagicMock())
+    mock_neo4j = MagicMock()
+    mock_session = MagicMock()
+    mock_neo4j.driver.session.return_value.__aenter__.return_value = mock_session
+    queries = []
+
+    async def mock_run(query):
+        queries.append(query)
+        if "apoc.meta.stats" in query:
+            error = Exception("There is no procedure with the name `apoc.meta.stats`")
+            error.code = "Neo.ClientError.Procedure.ProcedureNotFound"
+            raise error
+        return AsyncIterator([])
+
+    mock_session.run = mock_run
+
+    await agent._extract_raw_schema_async(mock_neo4j)
+    await agent._extract_raw_schema_async(mock_neo4j)
+
+    assert sum("apoc.meta.stats" in query for query in queries) == 1
+    assert sum("CALL db.labels" in query for query in queries) == 2
+
+
 @pytest.mark.asyncio
 async def test_extract_raw_schema_async_partial_failures():
     """Test schema extraction when some queries fail but others succeed."""
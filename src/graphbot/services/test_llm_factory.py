@@ -1,8 +1,11 @@
 import pytest
 import os
 import yaml
-from unittest.mock import patch, MagicMock
-from graphbot.services.llm import LLMFactory, GeminiProvider, LLMProvider, LLMResponse
+from unittest.mock import patch, MagicMock, AsyncMock
+from graphbot.services.llm import (
+    LLMFactory, GeminiProvider, LLMProvider, LLMResponse,
+    LLMError, LLMRateLimitError, LLMServerError, LLMTimeoutError, load_config,
+)
 from graphbot.services.context_manager import ContextManager
 
 # Sample config for testing
@@ -37,6 +40,95 @@ def test_factory_creates_gemini_provider(mock_configure, mock_getenv, mock_confi
     assert provider.main_model == "gemini-test"
     mock_configure.assert_called_once_with(api_key="fake_key")
 
+@pytest.mark.asyncio
+@patch("graphbot.services.llm.os.getenv", return_value="fake_key")
+@patch("google.generativeai.configure")
+@patch("google.generativeai.GenerativeModel")
+async def test_gemini_provider_reuses_model_objects(mock_model_cls, mock_configure, mock_getenv, mock_config_file):
+    model = mock_model_cls.return_value
+    model.generate_content_async = AsyncMock(return_value=MagicMock(text="ok"))
+    model.count_tokens_async = AsyncMock(return_value=MagicMock(total_tokens=7))
+    provider = LLMFactory.get_provider(mock_config_file)
+
+    await provider.generate_text("first")
+    await provider.generate_text("second")
+    assert await provider.count_tokens("text") == 7
+    await provider.generate_text("third", is_worker=True)
+
+    assert [c.args[0] for c in mock_model_cls.call_args_list] == ["gemini-test", "gemini-worker"]
+
+@pytest.mark.asyncio
+@patch("graphbot.services.llm.os.getenv", return_value="fake_key")
+@patch("google.generativeai.configure")
+@patch("google.generativeai.GenerativeModel")
+async def test_gemini_provider_answers_repeated_prompts_from_cache(mock_model_cls, mock_configure, mock_getenv, tmp_path):
+    from graphbot.services.cache_manager import CacheManager
+
+    model = mock_model_cls.return_value
+    model.generate_content_async = AsyncMock(return_value=MagicMock(text="MATCH (n) RETURN n"))
+    cache = CacheManager(cache_file=str(tmp_path / "cache.json"))
+    provider = GeminiProvider(TEST_CONFIG["profiles"]["test_gemini"], response_cache=cache)
+
+    try:
+        first = await provider.generate_text("prompt", system_instruction="system")
+        again = await provider.generate_text("prompt", system_instruction="system")
+        other = await provider.generate_text("prompt", system_instruction="system", is_worker=True)
+    finally:
+        cache.close()
+
+    assert first == again
+    assert other.model_name == "gemini-worker"
+    assert model.generate_content_async.await_count == 2
+
+@pytest.mark.parametrize("message, expected", [
+    ("429 Resource exhausted. Please retry in 12.5s.", (LLMRateLimitError, 12.5)),
+    ("503 Service Unavailable", (LLMServerError, None)),
+    ("504 Deadline Exceeded", (LLMTimeoutError, None)),
+    ("Deadline Exceeded", (LLMTimeoutError, None)),
+    ("Invalid value 5030 for field", (LLMError, None)),
+])
+def test_gemini_provider_classifies_errors(message, expected):
+    provider = GeminiProvider.__new__(GeminiProvider)
+
+    assert provider._classify_error(Exception(message)) == expected
+
+@pytest.mark.asyncio
+@patch("graphbot.services.llm.os.getenv", return_value="fake_key")
+@patch("google.generativeai.configure")
+@patch("google.generativeai.GenerativeModel")
+async def test_gemini_provider_retries_with_jittered_backoff(mock_model_cls, mock_configure, mock_getenv):
+    model = mock_model_cls.return_value
+    model.generate_content_async = AsyncMock(side_effect=[
+        Exception("503 Service Unavailable"),
+        Exception("429 Quota exceeded. Please retry in 4s."),
+        MagicMock(text="ok"),
+    ])
+    provider = GeminiProvider(TEST_CONFIG["profiles"]["test_gemini"])
+
+    with patch("graphbot.services.llm.asyncio.sleep", new_callable=AsyncMock) as sleep, \
+            patch("graphbot.services.llm.random.uniform", return_value=0.25) as uniform:
+        response = await provider.generate_text("prompt")
+
+    assert response.content == "ok"
+    uniform.assert_called_once_with(0, provider.BASE_RETRY_DELAY)
+    # A server-provided wait is honoured as given
+    assert [c.args[0] for c in sleep.await_args_list] == [0.25, 4.0]
+
+def test_load_config_reparses_only_after_the_file_changes(mock_config_file):
+    first = load_config(mock_config_file)
+
+    with patch("graphbot.services.llm.yaml.safe_load") as safe_load:
+        assert load_config(mock_config_file) is first
+        safe_load.assert_not_called()
+
+    stat = os.stat(mock_config_file)
+    with open(mock_config_file, "a") as f:
+        f.write("extra: true\n")
+    # Bump the timestamp explicitly in case the write lands within the same clock tick
+    os.utime(mock_config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert load_config(mock_config_file)["extra"] is True
+
 @pytest.mark.asyncio
 async def test_context_manager_truncation():
     # Mock provider
@@ -89,3 +181,57 @@ async def test_context_manager_hard_truncation():
     assert "truncated" in prompt
     assert len(prompt) < 2000 # Rough check
 
+
+@pytest.mark.asyncio
+async def test_context_manager_memoizes_token_counts():
+    provider = MagicMock(spec=LLMProvider)
+    provider.count_tokens = AsyncMock(return_value=7)
+    manager = ContextManager(provider)
+
+    long_text = "schema " * 100
+
+    assert await manager._safe_count_tokens("system prompt") == 7
+    assert await manager._safe_count_tokens("system prompt") == 7
+    assert await manager._safe_count_tokens(long_text) == 7
+    assert await manager._safe_count_tokens(long_text) == 7
+
+    assert provider.count_tokens.await_count == 2
+
+@pytest.mark.asyncio
+async def test_context_manager_skips_counting_short_history():
+    provider = MagicMock(spec=LLMProvider)
+    provider.count_tokens = AsyncMock(return_value=5)
+    manager = ContextManager(provider, max_tokens=3000)
+
+    history = [{"role": "user", "content": "Hi"}, {"role": "assistant", "content": "Yo"}]
+    prompt = await manager.prepare_prompt("Hello", "System", history=history)
+
+    assert "USER: Hi\nASSISTANT: Yo" in prompt
+    # Everything fits by character count alone, so nothing is tokenized
+    assert provider.count_tokens.await_count == 0
+
+@pytest.mark.asyncio
+async def test_context_manager_counts_tokens_near_the_limit():
+    provider = MagicMock(spec=LLMProvider)
+    provider.count_tokens = AsyncMock(side_effect=lambda text: len(text) // 4)
+    manager = ContextManager(provider, max_tokens=1500)
+
+    # 800 characters exceed the 500 left after the answer buffer, but only 200 tokens do not
+    prompt = await manager.prepare_prompt("Hello", "System", context_data="C" * 800)
+
+    assert "C" * 800 in prompt
+    assert "truncated" not in prompt
+    assert provider.count_tokens.await_count == 3
+
+@pytest.mark.asyncio
+async def test_context_manager_counts_tokens_for_byte_heavy_text():
+    provider = MagicMock(spec=LLMProvider)
+    # Byte fallback: each emoji costs more than one token
+    provider.count_tokens = AsyncMock(side_effect=lambda text: 2 * len(text))
+    manager = ContextManager(provider, max_tokens=3000)
+
+    # 1200 characters fit the 2000-token budget by length, but not by token count
+    prompt = await manager.prepare_prompt("Hello", "System", context_data="😀" * 1200)
+
+    assert provider.count_tokens.await_count > 0
+    assert "truncated" in prompt
@@ -35,3 +35,71 @@ async def test_inspect_value_distribution_error(inspector):
     
     assert values == []
 
+
+@pytest.mark.asyncio
+async def test_interactive_check_falls_back_to_concurrent_probes_in_order(inspector, monkeypatch):
+    import asyncio
+    from graphbot.services import schema_inspector
+
+    in_flight = 0
+    peak = 0
+
+    async def fake_inspect(label, prop, limit=10):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01 if label == "A" else 0)
+        in_flight -= 1
+        if prop == "bad":
+            raise RuntimeError("boom")
+        return [f"{label}-{prop}"]
+
+    printed = []
+    inspector.neo4j.execute_query_async.side_effect = Exception("batch rejected")
+    monkeypatch.setattr(inspector, "inspect_value_distribution", fake_inspect)
+    monkeypatch.setattr(schema_inspector.console, "print", lambda msg="", *a, **k: printed.append(msg))
+
+    await inspector.interactive_check(["A", "B"], ["name", "bad"])
+
+    checks = [line for line in printed if line.startswith("Checking")]
+    assert checks == [f"Checking [bold]{pair}[/bold]..." for pair in ("A.name", "A.bad", "B.name", "B.bad")]
+    assert any("Error checking A.bad: boom" in line for line in printed)
+    assert peak == 4
+
+
+@pytest.mark.asyncio
+async def test_inspect_value_distributions_batches_pairs_into_one_query(inspector):
+    inspector.neo4j.execute_query_async.return_value = [
+        {"idx": 0, "vals": ["Alice", "Bob"]},
+        {"idx": 2, "vals": [True, False]},
+    ]
+
+    values = await inspector.inspect_value_distributions(
+        [("Person", "name"), ("Person", ""), ("Account", "is`flagged")], limit=5
+    )
+
+    assert values == [["Alice", "Bob"], [], [True, False]]
+    inspector.neo4j.execute_query_async.assert_called_once()
+    query, params = inspector.neo4j.execute_query_async.call_args.args
+    assert "MATCH (n:`Person`)" in query and "MATCH (n:`Account`)" in query
+    assert "n.`is``flagged`" in query
+    assert query.count("UNION ALL") == 1
+    assert params == {"limit": 5}
+
+
+@pytest.mark.asyncio
+async def test_interactive_check_flags_boolean_like_values(inspector, monkeypatch):
+    from graphbot.services import schema_inspector
+
+    inspector.neo4j.execute_query_async.return_value = [
+        {"idx": 0, "vals": ["Yes", "No"]},
+        {"idx": 1, "vals": ["x" * 80]},
+    ]
+    printed = []
+    monkeypatch.setattr(schema_inspector.console, "print", lambda msg="", *a, **k: printed.append(msg))
+
+    await inspector.interactive_check(["Account"], ["isFraud", "notes"])
+
+    hints = [i for i, line in enumerate(printed) if "flag/boolean" in line]
+    assert hints == [3]
+    assert f"[dim]{'x' * 50}[/dim]" in printed[5]
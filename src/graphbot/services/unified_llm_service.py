@@ -5,6 +5,7 @@ from rich.console import Console
 from graphbot.services.llm import (
     LLMFactory, 
     LLMProvider,
+    load_config,
     LLMError,
     LLMRateLimitError,
     LLMAuthenticationError,
@@ -183,20 +184,16 @@ Results sample: {str(results)[:500]}
         default_prompts = self._provider.config.get('default_prompts', {})
         prompt_name = default_prompts.get(key)
         
-        # Load full config to get prompts section (not just profile)
-        # This is a bit inefficient reading file again, but okay for MVP
+        if not prompt_name:
+            return None
+        
+        # Load full config to get prompts section (not just profile); parsed once per file change
         try:
-            with open(self.config_path, 'r') as f:
-                full_config = import_yaml().safe_load(f)
-                prompts = full_config.get('prompts', {})
-                return prompts.get(prompt_name)
+            prompts = load_config(self.config_path).get('prompts', {})
+            return prompts.get(prompt_name)
         except Exception:
             return None
 
-def import_yaml():
-    import yaml
-    return yaml
-
 class WorkerModelAdapter:
     def __init__(self, provider: LLMProvider):
         self.provider = provider
@@ -0,0 +1,12 @@
+import pytest
+
+from graphbot.services import cache_manager as cache_module
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache_manager(tmp_path, monkeypatch):
+    """Point the global cache manager at a temp file so exit-time flushes stay out of the repo."""
+    manager = cache_module.CacheManager(cache_file=str(tmp_path / "graphbot_cache.json"))
+    monkeypatch.setattr(cache_module, "_cache_manager", manager)
+    yield manager
+    manager.close()